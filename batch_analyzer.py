@@ -4,152 +4,317 @@ Batch Workout Session Analyzer - Functional Programming Approach
 Analyzes entire workout videos (30-60 minutes) for comprehensive insights
 """
 
+import math
+import operator
+import os
 import sys
-import json
+import orjson
+import queue
+import threading
+import av
+from av.codec.hwaccel import HWAccel
 import cv2
 import numpy as np
-from typing import Dict, List, Tuple, Optional
+from typing import Callable, Dict, Iterator, List, Tuple, Optional
 import mediapipe as mp
+from mediapipe.calculators.tensor import tensors_to_detections_calculator_pb2
+from mediapipe.calculators.util import thresholding_calculator_pb2
+from mediapipe.framework import calculator_pb2
+from mediapipe.tasks import python as mp_tasks
+from mediapipe.tasks.python import vision
 from pathlib import Path
 import time
 
+from pose_backends import pose_landmarker_model, select_pose_backend
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional; the kernels below then run as plain Python
+    def njit(*args, **kwargs):
+        if args and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+# Pose settings shared by the single-frame model and the streaming graph
+POSE_SETTINGS = {
+    'model_complexity': 1,
+    'smooth_landmarks': True,
+    'min_detection_confidence': 0.7,
+    'min_tracking_confidence': 0.5,
+}
+
 # Initialize MediaPipe
 mp_pose = mp.solutions.pose
 pose_model = mp_pose.Pose(
     static_image_mode=False,
-    model_complexity=1,
-    smooth_landmarks=True,
     enable_segmentation=False,
-    min_detection_confidence=0.7,
-    min_tracking_confidence=0.5
+    **POSE_SETTINGS
 )
 
-def extract_frames_from_video(video_path: str, sample_rate: int = 30) -> List[np.ndarray]:
-    """Extract frames from video at specified sample rate (every Nth frame)"""
-    cap = cv2.VideoCapture(video_path)
-    frames = []
+# Same graph that mp.solutions.pose.Pose runs, fed directly for pipelined inference.
+# Its model files resolve through the resource dir set up by constructing pose_model.
+POSE_GRAPH_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(mp.__file__)),
+    'mediapipe/modules/pose_landmark/pose_landmark_cpu.binarypb'
+)
+# Packet timestamp step per sampled frame (Pose.process also simulates 30 FPS)
+FRAME_INTERVAL_US = 33333
+# Input side of the pose landmark model; the person ROI is cropped from the frame
+# and rescaled to this size, so frames are downscaled until their short edge hits it
+POSE_INPUT_SIZE = 256
+# Largest sampling stride (in source frames) at which the previous frame's
+# landmarks still locate the person; beyond it every frame needs the detector
+MAX_TRACKING_STRIDE = 5
+# Rest gating: a sampled frame whose 64x64 thumbnail differs from the last
+# detected frame's by less than this mean absolute pixel difference is still,
+# and after REST_MIN_FRAMES still frames in a row detection is skipped
+REST_THUMBNAIL_SIZE = (64, 64)
+REST_ENERGY_THRESHOLD = 2.0
+REST_MIN_FRAMES = 3
+
+# MediaPipe landmark indices of the joints we analyze; poses are stored as
+# (frames, N_JOINTS, 3) arrays of (x, y, visibility) in this column order
+LANDMARK_IDX = np.array([0, 11, 12, 13, 14, 15, 16, 23, 24, 25, 26, 27, 28])
+N_JOINTS = len(LANDMARK_IDX)
+# Picks the analyzed joints out of a landmark list in one C call (Python int
+# indices, since protobuf lists index slowly with NumPy integer scalars)
+_gather_joints = operator.itemgetter(*LANDMARK_IDX.tolist())
+(NOSE, L_SHOULDER, R_SHOULDER, L_ELBOW, R_ELBOW, L_WRIST, R_WRIST,
+ L_HIP, R_HIP, L_KNEE, R_KNEE, L_ANKLE, R_ANKLE) = range(N_JOINTS)
+
+# Per-frame exercise labels produced by classify_exercise_frames
+UNKNOWN, SQUAT, PUSHUP, PLANK, STANDING = range(5)
+EXERCISE_NAMES = ('unknown', 'squat', 'pushup', 'plank', 'standing')
+
+# Marks the end of the frame stream between pipeline stages
+_END_OF_STREAM = object()
+
+def _downscaled_size(width: int, height: int, short_edge: Optional[int]) -> Dict:
+    """Output size kwargs shrinking a frame so its shorter side is short_edge (empty if no shrink)"""
+    if not short_edge:
+        return {}
+    scale = short_edge / min(width, height)
+    if scale >= 1.0:
+        return {}
+    return {'width': round(width * scale), 'height': round(height * scale)}
+
+def iter_video_frames(video_path: str, sample_rate: int, video_info: Dict,
+                      short_edge: Optional[int] = None, pixel_format: str = 'bgr24') -> Iterator[np.ndarray]:
+    """Yield every Nth frame of a video; fills video_info with duration and frame count when done.
+    
+    Frames are BGR unless another PyAV pixel_format (e.g. 'rgb24') is requested.
+    If short_edge is given, larger frames are downscaled (keeping aspect ratio)
+    so their shorter side equals it. Set FA_VIDEO_HWACCEL (e.g. 'cuda',
+    'vaapi') to decode on the GPU, falling back to software if unavailable.
+    """
+    hwaccel = os.environ.get('FA_VIDEO_HWACCEL')
+    container = av.open(
+        video_path,
+        hwaccel=HWAccel(device_type=hwaccel, allow_software_fallback=True) if hwaccel else None
+    )
     frame_count = 0
-    
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-            
-        if frame_count % sample_rate == 0:  # Sample every Nth frame
-            frames.append(frame)
-            
-        frame_count += 1
-    
-    cap.release()
-    total_duration = frame_count / cap.get(cv2.CAP_PROP_FPS) if cap.get(cv2.CAP_PROP_FPS) > 0 else 0
-    
-    return frames, total_duration, frame_count
 
-def detect_pose_in_frame(frame: np.ndarray) -> Optional[Dict]:
-    """Detect pose landmarks in a single frame"""
+    try:
+        stream = container.streams.video[0]
+        stream.thread_type = 'AUTO'  # Frame- and slice-threaded decoding
+
+        for frame in container.decode(stream):
+            if frame_count % sample_rate == 0:  # Sample every Nth frame
+                # Only sampled frames are converted, with scaling and colour conversion in one swscale pass
+                yield frame.to_ndarray(
+                    format=pixel_format, interpolation='AREA',
+                    **_downscaled_size(frame.width, frame.height, short_edge)
+                )
+
+            frame_count += 1
+
+        fps = stream.average_rate
+        video_info['total_duration'] = frame_count / float(fps) if fps else 0
+        video_info['total_frames'] = frame_count
+    finally:
+        container.close()
+
+def extract_frames_from_video(video_path: str, sample_rate: int = 30) -> Tuple[List[np.ndarray], float, int]:
+    """Extract frames from video at specified sample rate (every Nth frame)"""
+    video_info = {}
+    frames = list(iter_video_frames(video_path, sample_rate, video_info))
+
+    return frames, video_info['total_duration'], video_info['total_frames']
+
+def _landmarks_to_array(landmarks) -> np.ndarray:
+    """Gather the analyzed joints of a 33-landmark pose into a (N_JOINTS, 3) array"""
+    return np.array(
+        [(lm.x, lm.y, lm.visibility) for lm in _gather_joints(landmarks)],
+        dtype=np.float32
+    )
+
+def detect_pose_in_frame(frame: np.ndarray) -> Optional[np.ndarray]:
+    """Detect pose landmarks in a single frame as a (N_JOINTS, 3) array of (x, y, visibility)"""
     frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
     results = pose_model.process(frame_rgb)
     
     if not results.pose_landmarks:
         return None
         
-    # Extract key landmarks
-    landmarks = {}
-    landmark_map = {
-        'nose': 0, 'left_shoulder': 11, 'right_shoulder': 12,
-        'left_elbow': 13, 'right_elbow': 14, 'left_wrist': 15, 'right_wrist': 16,
-        'left_hip': 23, 'right_hip': 24, 'left_knee': 25, 'right_knee': 26,
-        'left_ankle': 27, 'right_ankle': 28
-    }
-    
-    for name, idx in landmark_map.items():
-        if idx < len(results.pose_landmarks.landmark):
-            landmark = results.pose_landmarks.landmark[idx]
-            landmarks[name] = (landmark.x, landmark.y, landmark.visibility)
-    
-    return landmarks
+    return _landmarks_to_array(results.pose_landmarks.landmark)
 
-def classify_exercise_from_pose(landmarks: Dict) -> str:
-    """Classify current exercise based on pose landmarks"""
-    if not landmarks:
-        return 'unknown'
-    
-    # Get key positions (using only x, y coordinates)
-    try:
-        left_shoulder = landmarks['left_shoulder'][:2]
-        right_shoulder = landmarks['right_shoulder'][:2]
-        left_hip = landmarks['left_hip'][:2]
-        right_hip = landmarks['right_hip'][:2]
-        left_knee = landmarks['left_knee'][:2]
-        right_knee = landmarks['right_knee'][:2]
-        
-        # Calculate average positions
-        shoulder_y = (left_shoulder[1] + right_shoulder[1]) / 2
-        hip_y = (left_hip[1] + right_hip[1]) / 2
-        knee_y = (left_knee[1] + right_knee[1]) / 2
-        
-        # Exercise classification logic
-        if hip_y > shoulder_y + 0.15 and knee_y > hip_y - 0.1:
-            return 'squat'
-        elif abs(shoulder_y - hip_y) < 0.2 and 'left_wrist' in landmarks:
-            wrist_y = landmarks['left_wrist'][1]
-            if abs(wrist_y - shoulder_y) < 0.15:
-                return 'pushup'
-        elif abs(shoulder_y - hip_y) < 0.15:
-            return 'plank'
-        else:
-            return 'standing'
-            
-    except (KeyError, IndexError):
+def _set_calculator_option(config: calculator_pb2.CalculatorGraphConfig, node_name: str,
+                           options_type, field: str, value) -> None:
+    """Set one options field on a named node of a canonical graph config"""
+    for node in config.node:
+        if node.name != node_name:
+            continue
+        for any_options in node.node_options:
+            if any_options.Is(options_type.DESCRIPTOR):
+                options = options_type()
+                any_options.Unpack(options)
+                setattr(options, field, value)
+                any_options.Pack(options)
+                return
+        setattr(node.options.Extensions[options_type.ext], field, value)
+        return
+    raise ValueError(f"Calculator node {node_name} not found in pose graph")
+
+def create_pose_graph(on_pose: Callable[[int, np.ndarray], None], max_queue_size: int,
+                      tracking: bool = True) -> mp.CalculatorGraph:
+    """Start a streaming pose graph that reports (timestamp, pose) for every frame with a detection.
+    
+    Unlike Pose.process, frames are submitted without waiting for the previous
+    one to finish, letting MediaPipe pipeline detection, landmarks and tracking
+    across frames. Submission blocks once max_queue_size frames are queued.
+    With tracking=False each frame is treated as a standalone image: no landmark
+    pass on a stale ROI and no smoothing across distant frames.
+    """
+    validated_graph = mp.ValidatedGraphConfig()
+    validated_graph.initialize(binary_graph_path=POSE_GRAPH_PATH)
+    config = calculator_pb2.CalculatorGraphConfig()
+    config.ParseFromString(validated_graph.binary_config)
+    
+    _set_calculator_option(
+        config, 'posedetectioncpu__TensorsToDetectionsCalculator',
+        tensors_to_detections_calculator_pb2.TensorsToDetectionsCalculatorOptions,
+        'min_score_thresh', POSE_SETTINGS['min_detection_confidence']
+    )
+    _set_calculator_option(
+        config, 'poselandmarkbyroicpu__tensorstoposelandmarksandsegmentation__ThresholdingCalculator',
+        thresholding_calculator_pb2.ThresholdingCalculatorOptions,
+        'threshold', POSE_SETTINGS['min_tracking_confidence']
+    )
+    
+    graph = mp.CalculatorGraph(graph_config=config)
+    graph.max_queue_size = max_queue_size
+    graph.graph_input_stream_add_mode = mp.GraphInputStreamAddMode.WAIT_TILL_NOT_FULL
+    
+    def callback(stream_name: str, packet: mp.Packet) -> None:
+        if not packet.is_empty():
+            on_pose(packet.timestamp.value, _landmarks_to_array(mp.packet_getter.get_proto(packet).landmark))
+    
+    graph.observe_output_stream('pose_landmarks', callback, True)
+    graph.start_run({
+        'model_complexity': mp.packet_creator.create_int(POSE_SETTINGS['model_complexity']),
+        'smooth_landmarks': mp.packet_creator.create_bool(POSE_SETTINGS['smooth_landmarks'] and tracking),
+        'enable_segmentation': mp.packet_creator.create_bool(False),
+        'smooth_segmentation': mp.packet_creator.create_bool(False),
+        'use_prev_landmarks': mp.packet_creator.create_bool(tracking),
+    })
+    return graph
+
+def create_pose_landmarker(model_path: str, use_gpu: bool) -> vision.PoseLandmarker:
+    """Create a Tasks API pose landmarker for video from a pose_landmarker_*.task bundle.
+    
+    Selected by POSE_BACKEND or FA_POSE_LANDMARKER_MODEL (see pose_backends),
+    which allows swapping in other bundles such as int8-quantized ones (XNNPACK
+    runs their integer kernels on CPU). FA_USE_GPU=1 runs it on the GPU
+    delegate instead; the solutions graph only runs on CPU from Python. GPU upload costs can outweigh the
+    speedup on desktops, so CPU stays the default.
+    """
+    delegate = mp_tasks.BaseOptions.Delegate.GPU if use_gpu else mp_tasks.BaseOptions.Delegate.CPU
+    options = vision.PoseLandmarkerOptions(
+        base_options=mp_tasks.BaseOptions(model_asset_path=model_path, delegate=delegate),
+        running_mode=vision.RunningMode.VIDEO,
+        num_poses=1,
+        min_pose_detection_confidence=POSE_SETTINGS['min_detection_confidence'],
+        min_tracking_confidence=POSE_SETTINGS['min_tracking_confidence']
+    )
+    return vision.PoseLandmarker.create_from_options(options)
+
+def classify_exercise_frames(poses: np.ndarray) -> np.ndarray:
+    """Classify the exercise of every frame at once; returns (frames,) int8 labels (see EXERCISE_NAMES)"""
+    # Average positions per frame (y coordinates only)
+    shoulder_y = 0.5 * (poses[:, L_SHOULDER, 1] + poses[:, R_SHOULDER, 1])
+    hip_y = 0.5 * (poses[:, L_HIP, 1] + poses[:, R_HIP, 1])
+    knee_y = 0.5 * (poses[:, L_KNEE, 1] + poses[:, R_KNEE, 1])
+    wrist_y = poses[:, L_WRIST, 1]
+    torso_level = np.abs(shoulder_y - hip_y)
+    
+    # Exercise classification logic; the first matching rule wins
+    return np.select(
+        [
+            np.isnan(poses[:, NOSE, 0]),
+            (hip_y > shoulder_y + 0.15) & (knee_y > hip_y - 0.1),
+            (torso_level < 0.2) & (np.abs(wrist_y - shoulder_y) < 0.15),
+            torso_level < 0.2,
+            torso_level < 0.15,
+        ],
+        [UNKNOWN, SQUAT, PUSHUP, UNKNOWN, PLANK],
+        default=STANDING
+    ).astype(np.int8)
+
+def classify_exercise_from_pose(pose: Optional[np.ndarray]) -> str:
+    """Classify current exercise based on a single frame's pose landmarks"""
+    if pose is None:
         return 'unknown'
+    return EXERCISE_NAMES[classify_exercise_frames(pose[np.newaxis])[0]]
+
+@njit(cache=True)
+def _step_rep_state(in_rep: int, event: int) -> Tuple[int, int]:
+    """Advance the two-threshold rep state machine without branching; returns (rep completed, in_rep).
+    
+    event is +1 (enter rep), -1 (leave rep) or 0 (neither / NaN). A rep
+    completes on a -1 event while in a rep; 0 events keep the current state,
+    so missing poses never break a rep in progress.
+    """
+    return in_rep * (event < 0), min(1, max(0, in_rep + event))
+
+@njit(cache=True)
+def _count_squat_reps(poses: np.ndarray) -> int:
+    """Squat: deep squat position enters a rep, return to standing completes it"""
+    reps = 0
+    in_rep = 0
+    for i in range(poses.shape[0]):
+        hip_y = 0.5 * (poses[i, L_HIP, 1] + poses[i, R_HIP, 1])
+        knee_y = 0.5 * (poses[i, L_KNEE, 1] + poses[i, R_KNEE, 1])
+        completed, in_rep = _step_rep_state(in_rep, int(hip_y > knee_y - 0.05) - int(hip_y < knee_y - 0.15))
+        reps += completed
+    return reps
+
+@njit(cache=True)
+def _count_pushup_reps(poses: np.ndarray) -> int:
+    """Pushup: bottom position enters a rep, top position completes it"""
+    reps = 0
+    in_rep = 0
+    for i in range(poses.shape[0]):
+        shoulder_wrist_gap = abs(poses[i, L_SHOULDER, 1] - poses[i, L_WRIST, 1])
+        completed, in_rep = _step_rep_state(in_rep, int(shoulder_wrist_gap < 0.1) - int(shoulder_wrist_gap > 0.2))
+        reps += completed
+    return reps
 
-def count_reps_in_sequence(poses: List[Dict], exercise_type: str) -> int:
+def _count_no_reps(poses: np.ndarray) -> int:
+    return 0
+
+# Rep counter per exercise, chosen once per segment; each only reads the joints it needs
+REP_COUNTERS: Dict[str, Callable[[np.ndarray], int]] = {
+    'squat': _count_squat_reps,
+    'pushup': _count_pushup_reps,
+}
+
+def count_reps_in_sequence(poses: np.ndarray, exercise_type: str) -> int:
     """Count repetitions based on pose sequence for specific exercise"""
-    if exercise_type == 'unknown' or not poses:
+    if len(poses) == 0:
         return 0
-    
-    rep_count = 0
-    in_rep = False
-    
-    for pose in poses:
-        if not pose:
-            continue
-            
-        # Squat rep counting
-        if exercise_type == 'squat':
-            try:
-                hip_y = (pose['left_hip'][1] + pose['right_hip'][1]) / 2
-                knee_y = (pose['left_knee'][1] + pose['right_knee'][1]) / 2
-                
-                # Deep squat position
-                if hip_y > knee_y - 0.05 and not in_rep:
-                    in_rep = True
-                # Return to standing
-                elif hip_y < knee_y - 0.15 and in_rep:
-                    rep_count += 1
-                    in_rep = False
-            except KeyError:
-                continue
-                
-        # Pushup rep counting
-        elif exercise_type == 'pushup':
-            try:
-                shoulder_y = pose['left_shoulder'][1]
-                wrist_y = pose['left_wrist'][1]
-                
-                # Bottom position
-                if abs(shoulder_y - wrist_y) < 0.1 and not in_rep:
-                    in_rep = True
-                # Top position
-                elif abs(shoulder_y - wrist_y) > 0.2 and in_rep:
-                    rep_count += 1
-                    in_rep = False
-            except KeyError:
-                continue
-    
-    return rep_count
-
-def detect_fatigue_indicators(poses: List[Dict], exercise_type: str) -> Dict:
+    return int(REP_COUNTERS.get(exercise_type, _count_no_reps)(poses))
+
+def detect_fatigue_indicators(poses: np.ndarray, exercise_type: str) -> Dict:
     """Detect signs of fatigue based on form degradation"""
     if len(poses) < 10:
         return {'fatigue_score': 0.0, 'indicators': []}
@@ -185,116 +350,222 @@ def detect_fatigue_indicators(poses: List[Dict], exercise_type: str) -> Dict:
         'late_consistency': late_consistency
     }
 
-def calculate_form_consistency(poses: List[Dict], exercise_type: str) -> float:
+@njit(cache=True)
+def _mean_width_consistency(left_x: np.ndarray, right_x: np.ndarray) -> float:
+    """Mean of max(0, 1 - |change in shoulder width|) over consecutive valid frame pairs"""
+    total = 0.0
+    count = 0
+    for i in range(1, left_x.shape[0]):
+        consistency = 1.0 - abs(abs(left_x[i] - right_x[i]) - abs(left_x[i-1] - right_x[i-1]))
+        if not math.isnan(consistency):
+            total += max(0.0, consistency)
+            count += 1
+    return total / count if count else 0.0
+
+@njit(cache=True)
+def _mean_step_length(xy: np.ndarray) -> float:
+    """Mean Euclidean distance between consecutive valid (x, y) points"""
+    total = 0.0
+    count = 0
+    for i in range(1, xy.shape[0]):
+        step = math.hypot(xy[i, 0] - xy[i-1, 0], xy[i, 1] - xy[i-1, 1])
+        if not math.isnan(step):
+            total += step
+            count += 1
+    return total / count if count else 0.0
+
+def calculate_form_consistency(poses: np.ndarray, exercise_type: str) -> float:
     """Calculate how consistent the form is across poses"""
-    if not poses or exercise_type == 'unknown':
+    if len(poses) == 0 or exercise_type == 'unknown':
         return 0.0
     
-    # Simplified consistency check based on key joint positions
-    consistencies = []
-    
-    for i in range(1, len(poses)):
-        if poses[i] and poses[i-1]:
-            try:
-                # Compare shoulder width consistency
-                curr_shoulder_width = abs(poses[i]['left_shoulder'][0] - poses[i]['right_shoulder'][0])
-                prev_shoulder_width = abs(poses[i-1]['left_shoulder'][0] - poses[i-1]['right_shoulder'][0])
-                
-                consistency = 1.0 - abs(curr_shoulder_width - prev_shoulder_width)
-                consistencies.append(max(0.0, consistency))
-            except KeyError:
-                continue
-    
-    return np.mean(consistencies) if consistencies else 0.0
-
-def calculate_pose_stability(poses: List[Dict]) -> float:
+    # Simplified consistency check based on shoulder width between consecutive frames
+    return float(_mean_width_consistency(poses[:, L_SHOULDER, 0], poses[:, R_SHOULDER, 0]))
+
+def calculate_pose_stability(poses: np.ndarray) -> float:
     """Calculate pose stability (less movement = more stable)"""
     if len(poses) < 2:
         return 1.0
     
-    movements = []
+    # Movement of the nose between consecutive frames
+    avg_movement = _mean_step_length(poses[:, NOSE, :2])
+    return float(max(0.0, 1.0 - avg_movement * 10))  # Scale movement to stability score
+
+def segment_workout_into_exercises(poses: np.ndarray, timestamps: np.ndarray) -> List[Dict]:
+    """Segment the workout into different exercise periods.
     
-    for i in range(1, len(poses)):
-        if poses[i] and poses[i-1]:
-            try:
-                # Calculate movement of key points
-                nose_movement = np.sqrt(
-                    (poses[i]['nose'][0] - poses[i-1]['nose'][0])**2 +
-                    (poses[i]['nose'][1] - poses[i-1]['nose'][1])**2
-                )
-                movements.append(nose_movement)
-            except KeyError:
-                continue
+    Segments are runs of frames with the same exercise label, kept if longer
+    than 5 frames. They reference their frames as the half-open index range
+    [start, end) into poses rather than holding copies of them.
+    """
+    labels = classify_exercise_frames(poses)
     
-    avg_movement = np.mean(movements) if movements else 0.0
-    return max(0.0, 1.0 - avg_movement * 10)  # Scale movement to stability score
-
-def segment_workout_into_exercises(poses: List[Dict], timestamps: List[float]) -> List[Dict]:
-    """Segment the workout into different exercise periods"""
-    segments = []
-    current_exercise = None
-    segment_start = 0
-    segment_poses = []
+    # A new run starts wherever the label changes
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(labels)) + 1))
+    ends = np.append(starts[1:], len(labels))
     
-    for i, pose in enumerate(poses):
-        exercise = classify_exercise_from_pose(pose)
-        
-        if exercise != current_exercise:
-            # Save previous segment if it has enough data
-            if current_exercise and len(segment_poses) > 5:
-                segments.append({
-                    'exercise': current_exercise,
-                    'start_time': timestamps[segment_start],
-                    'end_time': timestamps[i-1] if i > 0 else timestamps[segment_start],
-                    'duration': timestamps[i-1] - timestamps[segment_start] if i > 0 else 0,
-                    'poses': segment_poses.copy(),
-                    'frame_count': len(segment_poses)
-                })
-            
-            # Start new segment
-            current_exercise = exercise
-            segment_start = i
-            segment_poses = [pose]
-        else:
-            segment_poses.append(pose)
-    
-    # Add final segment
-    if current_exercise and len(segment_poses) > 5:
+    keep = ends - starts > 5
+    starts, ends = starts[keep], ends[keep]
+    start_times = timestamps[starts]
+    end_times = timestamps[ends - 1]
+    durations = end_times - start_times
+    
+    segments = []
+    for start, end, start_time, end_time, duration in zip(
+            starts.tolist(), ends.tolist(), start_times.tolist(), end_times.tolist(), durations.tolist()):
         segments.append({
-            'exercise': current_exercise,
-            'start_time': timestamps[segment_start],
-            'end_time': timestamps[-1],
-            'duration': timestamps[-1] - timestamps[segment_start],
-            'poses': segment_poses,
-            'frame_count': len(segment_poses)
+            'exercise': EXERCISE_NAMES[labels[start]],
+            'start_time': start_time,
+            'end_time': end_time,
+            'duration': duration,
+            'start': start,
+            'end': end,
+            'frame_count': end - start
         })
     
     return segments
 
-def analyze_workout_session(video_path: str) -> Dict:
-    """Main function to analyze a complete workout session"""
+def detect_poses_in_video(video_path: str, sample_rate: int = 30, prefetch: int = 8,
+                          batch_size: int = 8) -> Tuple[np.ndarray, float, int]:
+    """Run decode -> pose detection -> collection as a pipeline.
+    
+    A reader thread decodes sampled frames to downscaled RGB while the calling
+    thread submits the previous ones to a streaming pose graph, so decoding
+    overlaps inference and consecutive frames overlap inside MediaPipe. Frames
+    cross between the threads in batches of `batch_size` to amortize queue
+    handoffs. The graph's input queue holds at most `prefetch` frames and the
+    read queue at most `prefetch` frames' worth of batches.
+    ROI tracking is only used when sampled frames are close enough for it to
+    hit. With a Tasks API backend selected (see pose_backends), frames go to
+    a pose landmarker instead. Frames in still stretches (rest, holds) skip
+    detection. Returns (poses, total_duration, total_frames) where poses is a
+    (frames, N_JOINTS, 3) array with NaN rows for missed and skipped frames.
+    """
+    # Written from MediaPipe's output thread, read only after the pose model is closed
+    poses_by_timestamp = {}
+
+    # The pose model is built before the reader starts, so a misconfigured or
+    # failing backend raises without leaving a reader behind
+    backend = select_pose_backend()
+    landmarker_model = pose_landmarker_model(backend)
+    if landmarker_model is not None:
+        try:
+            landmarker = create_pose_landmarker(landmarker_model, use_gpu=backend == 'trt_fp16')
+        except RuntimeError as e:
+            if backend != 'trt_fp16':
+                raise
+            # No usable GPU delegate here (e.g. no GPU support in this MediaPipe build)
+            print(f"GPU pose delegate unavailable, falling back to CPU: {e}", file=sys.stderr)
+            landmarker = create_pose_landmarker(landmarker_model, use_gpu=False)
+
+        def submit(frame_rgb: np.ndarray, timestamp_us: int) -> None:
+            image = mp.Image(image_format=mp.ImageFormat.SRGB, data=frame_rgb)
+            result = landmarker.detect_for_video(image, timestamp_us // 1000)
+            if result.pose_landmarks:
+                poses_by_timestamp[timestamp_us] = _landmarks_to_array(result.pose_landmarks[0])
+
+        close = landmarker.close
+    else:
+        graph = create_pose_graph(poses_by_timestamp.__setitem__, prefetch,
+                                  tracking=sample_rate <= MAX_TRACKING_STRIDE)
+
+        def submit(frame_rgb: np.ndarray, timestamp_us: int) -> None:
+            # copy=True: MediaPipe owns its pixels, so the decoder's array is freed right away
+            packet = mp.packet_creator.create_image_frame(image_format=mp.ImageFormat.SRGB, data=frame_rgb, copy=True)
+            graph.add_packet_to_input_stream('image', packet.at(timestamp_us))
+
+        close = graph.close  # Waits for every queued frame to be processed
+
+    read_q = queue.Queue(maxsize=max(1, prefetch // batch_size))
+    video_info = {}
+    # Set when the caller stops consuming, so the reader exits and closes the video
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        """Queue an item for the caller, giving up (False) once stop is set"""
+        while not stop.is_set():
+            try:
+                read_q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def reader():
+        # Decode straight to RGB so frames need no cvtColor pass or buffer before MediaPipe
+        frames = iter_video_frames(video_path, sample_rate, video_info,
+                                   short_edge=POSE_INPUT_SIZE, pixel_format='rgb24')
+        try:
+            batch = []
+            ref_small = None
+            still_frames = 0
+            for frame in frames:
+                # Frame-difference energy against the last detected frame; still frames are sent as None
+                small = cv2.resize(frame, REST_THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+                if ref_small is not None and cv2.absdiff(small, ref_small).mean() < REST_ENERGY_THRESHOLD:
+                    still_frames += 1
+                else:
+                    still_frames = 0
+                if still_frames >= REST_MIN_FRAMES:
+                    batch.append(None)
+                else:
+                    ref_small = small
+                    batch.append(frame)
+                if len(batch) == batch_size:
+                    if not put(batch):
+                        return
+                    batch = []
+            if batch and not put(batch):
+                return
+            put(_END_OF_STREAM)
+        except Exception as e:
+            put(e)
+        finally:
+            frames.close()  # Closes the container if decoding stopped early
+
+    threading.Thread(target=reader, daemon=True).start()
+
+    frame_count = 0
+    try:
+        while True:
+            item = read_q.get()
+            if item is _END_OF_STREAM:
+                break
+            if isinstance(item, Exception):
+                raise item
+
+            for frame in item:
+                if frame is not None:
+                    submit(frame, frame_count * FRAME_INTERVAL_US)
+                frame_count += 1
+    finally:
+        stop.set()
+        close()
+
+    # Skipped (still) frames stay NaN like missed ones: their pose wasn't observed
+    poses = np.full((frame_count, N_JOINTS, 3), np.nan, dtype=np.float32)
+    for timestamp, pose in poses_by_timestamp.items():
+        poses[timestamp // FRAME_INTERVAL_US] = pose
+
+    return poses, video_info['total_duration'], video_info['total_frames']
+
+def analyze_workout_session(video_path: str, sample_rate: int = 30) -> Dict:
+    """Main function to analyze a complete workout session (pose detection on every Nth frame)"""
     print(f"🎬 Analyzing workout session: {video_path}")
     
-    # Extract frames from video
-    frames, total_duration, total_frames = extract_frames_from_video(video_path, sample_rate=30)
-    print(f"📊 Extracted {len(frames)} frames from {total_duration:.1f}s video")
+    # Extract frames and analyze poses (frames without a detected pose stay NaN)
+    poses, total_duration, total_frames = detect_poses_in_video(video_path, sample_rate=sample_rate)
+    print(f"📊 Extracted {len(poses)} frames from {total_duration:.1f}s video")
     
-    if not frames:
+    if len(poses) == 0:
         return {'error': 'No frames extracted from video'}
     
-    # Analyze poses in all frames
-    poses = []
-    timestamps = []
+    timestamps = np.linspace(0, total_duration, len(poses), endpoint=False)
     
-    for i, frame in enumerate(frames):
-        pose = detect_pose_in_frame(frame)
-        poses.append(pose)
-        timestamps.append(i * (total_duration / len(frames)))
+    valid_poses = int(np.count_nonzero(~np.isnan(poses[:, NOSE, 0])))
+    print(f"🤸 Detected poses in {valid_poses}/{len(poses)} frames")
     
-    valid_poses = [p for p in poses if p is not None]
-    print(f"🤸 Detected poses in {len(valid_poses)}/{len(poses)} frames")
-    
-    if len(valid_poses) < 10:
+    if valid_poses < 10:
         return {'error': 'Insufficient pose data for analysis'}
     
     # Segment workout into exercises
@@ -309,8 +580,9 @@ def analyze_workout_session(video_path: str) -> Dict:
         if segment['exercise'] == 'unknown':
             continue
             
-        reps = count_reps_in_sequence(segment['poses'], segment['exercise'])
-        fatigue = detect_fatigue_indicators(segment['poses'], segment['exercise'])
+        segment_poses = poses[segment['start']:segment['end']]  # View, no copy
+        reps = count_reps_in_sequence(segment_poses, segment['exercise'])
+        fatigue = detect_fatigue_indicators(segment_poses, segment['exercise'])
         
         segment_analysis.append({
             'exercise': segment['exercise'],
@@ -345,11 +617,18 @@ def analyze_workout_session(video_path: str) -> Dict:
         'detailed_analysis': segment_analysis,
         'video_stats': {
             'total_frames': total_frames,
-            'analyzed_frames': len(frames),
-            'pose_detection_rate': len(valid_poses) / len(poses) if poses else 0
+            'analyzed_frames': len(poses),
+            'pose_detection_rate': valid_poses / len(poses) if len(poses) else 0
         }
     }
 
+def write_json(payload: Dict) -> None:
+    """Write a JSON document to stdout (orjson serializes NumPy values natively)"""
+    sys.stdout.flush()  # Keep ordering with earlier print() output
+    sys.stdout.buffer.write(orjson.dumps(payload, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+    sys.stdout.buffer.write(b"\n")
+    sys.stdout.flush()
+
 def main():
     """Command line interface for batch analysis"""
     if len(sys.argv) != 2:
@@ -369,14 +648,14 @@ def main():
         
         result['processing_time'] = processing_time
         
-        print(json.dumps(result, indent=2))
+        write_json(result)
         
     except Exception as e:
         error_response = {
             'error': f'Batch analysis failed: {str(e)}',
             'video_path': video_path
         }
-        print(json.dumps(error_response, indent=2))
+        write_json(error_response)
         sys.exit(1)
 
 if __name__ == "__main__":
@@ -6,11 +6,21 @@ Processes video data for pose estimation and form analysis
 
 import sys
 import json
+import atexit
 import base64
 import io
+import itertools
+import math
+import multiprocessing
+import multiprocessing.pool
+import os
+import threading
 import traceback
 import warnings
-from typing import Dict, List, Tuple, Optional
+from collections import Counter, deque
+from enum import IntEnum, IntFlag
+from types import SimpleNamespace
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Tuple, Optional, Union
 import numpy as np
 
 # Suppress warnings for cleaner output
@@ -20,32 +30,397 @@ try:
     import torch
     import torchvision
     from torchvision import transforms
+    import av
     import cv2
     from PIL import Image
     import mediapipe as mp
+    import orjson
     from mediapipe.python.solutions import pose as mp_pose
     from mediapipe.python.solutions import drawing_utils as mp_drawing
+    from mediapipe.tasks import python as mp_tasks
+    from mediapipe.tasks.python import vision
 except ImportError as e:
     print(json.dumps({"error": f"Missing dependencies: {e}"}))
     sys.exit(1)
 
+try:
+    from numba import njit
+except ImportError:  # numba is optional; the kernels below then run as plain Python
+    def njit(*args, **kwargs):
+        if args and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+from pose_backends import pose_landmarker_model, select_pose_backend
+
+
+class J(IntEnum):
+    """Rows of the keypoint array returned by MotionAnalyzer._extract_keypoints"""
+    NOSE = 0
+    LEFT_SHOULDER = 1
+    RIGHT_SHOULDER = 2
+    LEFT_ELBOW = 3
+    RIGHT_ELBOW = 4
+    LEFT_WRIST = 5
+    RIGHT_WRIST = 6
+    LEFT_HIP = 7
+    RIGHT_HIP = 8
+    LEFT_KNEE = 9
+    RIGHT_KNEE = 10
+    LEFT_ANKLE = 11
+    RIGHT_ANKLE = 12
+
+# Body part names used for keypoints in analysis results, in J order
+JOINT_NAMES = tuple(joint.name.lower() for joint in J)
+
+# Exercise codes returned by _detect_exercise
+SQUAT, PUSHUP, PLANK, GENERAL_EXERCISE = range(4)
+EXERCISE_NAMES = ('squat', 'pushup', 'plank', 'general_exercise')
+
+class FormFlag(IntFlag):
+    """Form findings reported by the scoring kernels, in report order"""
+    SQUAT_TOO_DEEP = 1 << 0
+    SQUAT_TOO_SHALLOW = 1 << 1
+    SQUAT_GOOD_DEPTH = 1 << 2
+    KNEES_CAVING = 1 << 3
+    LEANING_FORWARD = 1 << 4
+    SQUAT_EXCELLENT = 1 << 5
+    SQUAT_GOOD = 1 << 6
+    HIPS_MISALIGNED = 1 << 7
+    BODY_ALIGNED = 1 << 8
+    ARM_ANGLE_OFF = 1 << 9
+    PLANK_HIPS_UNEVEN = 1 << 10
+    PLANK_LEGS_BENT = 1 << 11
+    PLANK_EXCELLENT = 1 << 12
+    GENERAL_EXERCISE_DETECTED = 1 << 13
+    SHOULDERS_UNEVEN = 1 << 14
+
+# flag -> (errors, recommendations) it adds to the report
+FORM_MESSAGES = {
+    FormFlag.SQUAT_TOO_DEEP: (("Squatting too deep - may stress knees",), ()),
+    FormFlag.SQUAT_TOO_SHALLOW: ((), ("Try to squat deeper for better muscle activation",)),
+    FormFlag.SQUAT_GOOD_DEPTH: ((), ("Good squat depth!",)),
+    FormFlag.KNEES_CAVING: (("Knees caving inward",), ("Push knees outward, track over toes",)),
+    FormFlag.LEANING_FORWARD: (("Leaning too far forward",), ("Keep chest up and back straight",)),
+    FormFlag.SQUAT_EXCELLENT: ((), ("Excellent squat form!",)),
+    FormFlag.SQUAT_GOOD: ((), ("Good squat with minor improvements needed",)),
+    FormFlag.HIPS_MISALIGNED: (("Hips sagging or too high",), ("Keep body in straight line from head to heels",)),
+    FormFlag.BODY_ALIGNED: ((), ("Good body alignment!",)),
+    FormFlag.ARM_ANGLE_OFF: ((), ("Adjust arm angle for optimal pushup form",)),
+    FormFlag.PLANK_HIPS_UNEVEN: (("Hips not aligned with shoulders",), ("Keep hips level with shoulders",)),
+    FormFlag.PLANK_LEGS_BENT: (("Body not straight from hips to knees",), ("Maintain straight line throughout body",)),
+    FormFlag.PLANK_EXCELLENT: ((), ("Excellent plank form!",)),
+    FormFlag.GENERAL_EXERCISE_DETECTED: ((), ("Exercise detected - maintain good posture",)),
+    FormFlag.SHOULDERS_UNEVEN: (("Shoulders not level",), ("Keep shoulders level",)),
+}
+
+# Joint angles measured per exercise: names and (point, vertex, point) keypoint rows
+SQUAT_ANGLE_NAMES = ('left_knee',)
+SQUAT_TRIPLETS = np.array([[J.LEFT_HIP, J.LEFT_KNEE, J.LEFT_ANKLE]])
+PUSHUP_ANGLE_NAMES = ('left_arm',)
+PUSHUP_TRIPLETS = np.array([[J.LEFT_SHOULDER, J.LEFT_ELBOW, J.LEFT_WRIST]])
+
+# Keyframe caching: frames are compared as grayscale thumbnails of this size, and
+# a mean absolute difference below the threshold counts as an unchanged scene
+KEYFRAME_SIZE = (160, 90)
+KEYFRAME_DIFF_THRESHOLD = 3.0
+KEYFRAME_MAX_REUSE = 10
+
+@njit(cache=True)
+def _triplet_angles(points: np.ndarray, triplets: np.ndarray) -> np.ndarray:
+    """Angle in degrees at the middle point of each (point, vertex, point) row triplet.
+    
+    Scalar math per triplet: exercises measure one or two joints, where NumPy's
+    per-call overhead would outweigh the arithmetic. Degenerate triplets give NaN.
+    """
+    angles = np.empty(triplets.shape[0])
+    for i in range(triplets.shape[0]):
+        a, b, c = triplets[i, 0], triplets[i, 1], triplets[i, 2]
+        bax = points[a, 0] - points[b, 0]
+        bay = points[a, 1] - points[b, 1]
+        bcx = points[c, 0] - points[b, 0]
+        bcy = points[c, 1] - points[b, 1]
+        
+        norms = math.hypot(bax, bay) * math.hypot(bcx, bcy)
+        cosine_angle = (bax * bcx + bay * bcy) / norms if norms > 0 else math.nan
+        if cosine_angle > 1.0:
+            cosine_angle = 1.0
+        elif cosine_angle < -1.0:
+            cosine_angle = -1.0
+        angles[i] = math.degrees(math.acos(cosine_angle))
+    return angles
+
+@njit(cache=True)
+def _detect_exercise(kp: np.ndarray) -> int:
+    """Auto-detect the exercise code from a (13, 2) keypoint array"""
+    # Calculate average positions
+    shoulder_y = (kp[J.LEFT_SHOULDER, 1] + kp[J.RIGHT_SHOULDER, 1]) / 2
+    hip_y = (kp[J.LEFT_HIP, 1] + kp[J.RIGHT_HIP, 1]) / 2
+    knee_y = (kp[J.LEFT_KNEE, 1] + kp[J.RIGHT_KNEE, 1]) / 2
+    wrist_y = (kp[J.LEFT_WRIST, 1] + kp[J.RIGHT_WRIST, 1]) / 2
+    
+    # Detect squat: knees bent, hips lowered, arms raised/forward
+    if hip_y > shoulder_y + 0.1 and knee_y > hip_y - 0.05 and wrist_y < hip_y:
+        return SQUAT
+    
+    # Detect pushup: body horizontal (wrists, shoulders, hips aligned vertically), arms supporting
+    if abs(wrist_y - shoulder_y) < 0.15 and abs(shoulder_y - hip_y) < 0.2:
+        return PUSHUP
+    
+    # Detect plank: horizontal body, straight line
+    if abs(shoulder_y - hip_y) < 0.15 and abs(hip_y - knee_y) < 0.15:
+        return PLANK
+    
+    return GENERAL_EXERCISE
+
+# The scoring kernels use FormFlag.X.value since numba treats enum members as
+# constants of the enum type, which don't combine with plain ints
+@njit(cache=True)
+def _score_squat(kp: np.ndarray, knee_angle: float) -> Tuple[int, int]:
+    """Squat form score and findings given the left knee angle"""
+    score = 85
+    flags = 0
+    
+    if knee_angle < 70:
+        flags |= FormFlag.SQUAT_TOO_DEEP.value
+        score -= 10
+    elif knee_angle > 120:
+        flags |= FormFlag.SQUAT_TOO_SHALLOW.value
+        score -= 5
+    else:
+        flags |= FormFlag.SQUAT_GOOD_DEPTH.value
+    
+    # Check knee alignment
+    if abs(kp[J.LEFT_KNEE, 0] - kp[J.RIGHT_KNEE, 0]) < 0.08:
+        flags |= FormFlag.KNEES_CAVING.value
+        score -= 15
+    
+    # Simple check for spine alignment
+    if abs(kp[J.LEFT_SHOULDER, 0] - kp[J.LEFT_HIP, 0]) > 0.15:
+        flags |= FormFlag.LEANING_FORWARD.value
+        score -= 10
+    
+    if score > 80:
+        flags |= FormFlag.SQUAT_EXCELLENT.value
+    elif score > 60:
+        flags |= FormFlag.SQUAT_GOOD.value
+    
+    return max(0, min(100, score)), flags
+
+@njit(cache=True)
+def _score_pushup(kp: np.ndarray, arm_angle: float) -> Tuple[int, int]:
+    """Pushup form score and findings given the left arm angle"""
+    score = 85
+    flags = 0
+    
+    # Check body alignment (plank position)
+    hip_deviation = abs(kp[J.LEFT_HIP, 1] - (kp[J.LEFT_SHOULDER, 1] + kp[J.LEFT_ANKLE, 1]) / 2)
+    if hip_deviation > 0.1:
+        flags |= FormFlag.HIPS_MISALIGNED.value
+        score -= 15
+    else:
+        flags |= FormFlag.BODY_ALIGNED.value
+    
+    if arm_angle < 45 or arm_angle > 90:
+        flags |= FormFlag.ARM_ANGLE_OFF.value
+        score -= 5
+    
+    return max(0, min(100, score)), flags
+
+@njit(cache=True)
+def _score_plank(kp: np.ndarray) -> Tuple[int, int]:
+    """Plank form score and findings"""
+    score = 85
+    flags = 0
+    
+    # Check if body forms straight line
+    if abs(kp[J.LEFT_SHOULDER, 1] - kp[J.LEFT_HIP, 1]) > 0.08:
+        flags |= FormFlag.PLANK_HIPS_UNEVEN.value
+        score -= 10
+    
+    if abs(kp[J.LEFT_HIP, 1] - kp[J.LEFT_KNEE, 1]) > 0.08:
+        flags |= FormFlag.PLANK_LEGS_BENT.value
+        score -= 10
+    
+    if score > 80:
+        flags |= FormFlag.PLANK_EXCELLENT.value
+    
+    return max(0, min(100, score)), flags
+
+@njit(cache=True)
+def _score_general(kp: np.ndarray) -> Tuple[int, int]:
+    """Basic posture score and findings for other exercises"""
+    score = 75
+    flags = FormFlag.GENERAL_EXERCISE_DETECTED.value
+    
+    if abs(kp[J.LEFT_SHOULDER, 1] - kp[J.RIGHT_SHOULDER, 1]) > 0.05:
+        flags |= FormFlag.SHOULDERS_UNEVEN.value
+        score -= 10
+    
+    return max(0, min(100, score)), flags
+
+def _form_messages(flags: int) -> Tuple[List[str], List[str]]:
+    """Expand form flags into (errors, recommendations) lists"""
+    errors = []
+    recommendations = []
+    for flag, (flag_errors, flag_recommendations) in FORM_MESSAGES.items():
+        if flags & flag:
+            errors.extend(flag_errors)
+            recommendations.extend(flag_recommendations)
+    return errors, recommendations
+
+# Milliseconds between consecutive frames fed to a Tasks API landmarker in video mode
+TASKS_FRAME_INTERVAL_MS = 33
+
+
+class TasksPoseModel:
+    """Tasks API pose landmarker exposing the solutions `Pose.process` interface.
+    
+    Loads a pose_landmarker_*.task bundle and runs it on the GPU delegate
+    when use_gpu is set, which the solutions Pose cannot do from Python.
+    With static_image_mode every frame is detected independently, otherwise
+    frames are treated as consecutive video frames.
+    """
+    
+    def __init__(self, model_path: str, use_gpu: bool, static_image_mode: bool,
+                 min_detection_confidence: float, min_tracking_confidence: float):
+        delegate = mp_tasks.BaseOptions.Delegate.GPU if use_gpu else mp_tasks.BaseOptions.Delegate.CPU
+        self._static_image_mode = static_image_mode
+        options = vision.PoseLandmarkerOptions(
+            base_options=mp_tasks.BaseOptions(model_asset_path=model_path, delegate=delegate),
+            running_mode=vision.RunningMode.IMAGE if static_image_mode else vision.RunningMode.VIDEO,
+            num_poses=1,
+            min_pose_detection_confidence=min_detection_confidence,
+            min_tracking_confidence=min_tracking_confidence
+        )
+        self._options = options
+        self._landmarker = vision.PoseLandmarker.create_from_options(options)
+        self._timestamp_ms = 0
+    
+    def reset(self) -> None:
+        """Drop tracking state, like Pose.reset, so the next frame starts a new video"""
+        self._landmarker.close()
+        self._landmarker = vision.PoseLandmarker.create_from_options(self._options)
+        self._timestamp_ms = 0
+    
+    def process(self, frame_rgb: np.ndarray) -> SimpleNamespace:
+        """Detect the pose in an RGB frame; the result has `pose_landmarks.landmark` like Pose.process"""
+        image = mp.Image(image_format=mp.ImageFormat.SRGB, data=np.ascontiguousarray(frame_rgb))
+        if self._static_image_mode:
+            result = self._landmarker.detect(image)
+        else:
+            result = self._landmarker.detect_for_video(image, self._timestamp_ms)
+            self._timestamp_ms += TASKS_FRAME_INTERVAL_MS
+        
+        if not result.pose_landmarks:
+            return SimpleNamespace(pose_landmarks=None)
+        return SimpleNamespace(pose_landmarks=SimpleNamespace(landmark=result.pose_landmarks[0]))
+    
+    def close(self) -> None:
+        self._landmarker.close()
+
+
+# Form analysis is reused while no keypoint moved more than this (normalized
+# coordinates) since the last analyzed pose
+FORM_REUSE_EPSILON = 0.005
+
+# Frames are downscaled (keeping aspect ratio) until their short edge is this
+# size before pose detection; BlazePose's networks take 256x256 inputs
+POSE_INPUT_SIZE = 256
+
+# Parallel video analysis: consecutive frames per worker task (tracking carries
+# over within one and restarts at the next), and the fewest sampled frames worth
+# sending to the pool. Serially a frame takes ~20-30 ms; the pool adds IPC and a
+# tracking reset plus fresh detection per chunk, and its first use starts every
+# worker (torch and MediaPipe imports, two pose graphs each), so clips of a few
+# seconds finish sooner serially
+PARALLEL_CHUNK_SIZE = 16
+PARALLEL_MIN_FRAMES = 120
+
+# Worker processes analyze_video_data gives process_video (FA_VIDEO_WORKERS);
+# 1 keeps videos on the calling analyzer's own pose model
+VIDEO_WORKERS = max(1, int(os.environ.get('FA_VIDEO_WORKERS', 1)))
+
+
+def _pose_input_size(width: int, height: int) -> Dict:
+    """PyAV to_ndarray size arguments that downscale a frame so its short edge is POSE_INPUT_SIZE
+    (none for frames already that small)"""
+    scale = POSE_INPUT_SIZE / min(width, height)
+    if scale >= 1.0:
+        return {}
+    return {'width': round(width * scale), 'height': round(height * scale)}
+
+
+def _estimated_frame_count(stream) -> int:
+    """Frames in a PyAV video stream according to its header, or estimated from its duration (0 if unknown)"""
+    if stream.frames:
+        return stream.frames
+    if stream.duration and stream.time_base and stream.average_rate:
+        return int(stream.duration * stream.time_base * stream.average_rate)
+    return 0
+
 
 class MotionAnalyzer:
     """PyTorch-based motion analysis for exercise form evaluation"""
     
-    def __init__(self):
+    def __init__(self, model_complexity: int = 1):
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        self.model_complexity = model_complexity
         
-        # Initialize MediaPipe Pose
+        # Initialize MediaPipe Pose: a tracking model for video frames and a static
+        # Lite model for one-shot images, both from the backend picked by POSE_BACKEND.
+        # model_complexity picks the video model: 0=Lite, 1=Full, 2=Heavy
         self.mp_pose = mp.solutions.pose
-        self.pose_model = self.mp_pose.Pose(
-            static_image_mode=False,
-            model_complexity=1,  # 0=Lite, 1=Full, 2=Heavy
-            smooth_landmarks=True,
-            enable_segmentation=False,
-            min_detection_confidence=0.7,
-            min_tracking_confidence=0.5
-        )
+        self.pose_backend = select_pose_backend()
+        landmarker_model = pose_landmarker_model(self.pose_backend)
+        if landmarker_model is not None:
+            try:
+                self._pose_video, self._pose_image = self._create_tasks_pose_models(
+                    landmarker_model, use_gpu=self.pose_backend == 'trt_fp16'
+                )
+            except RuntimeError as e:
+                if self.pose_backend != 'trt_fp16':
+                    raise
+                # No usable GPU delegate here (it needs GL/EGL, e.g. not on a headless host)
+                print(f"GPU pose delegate unavailable, falling back to CPU: {e}", file=sys.stderr)
+                self.pose_backend = 'tflite_int8'
+                self._pose_video, self._pose_image = self._create_tasks_pose_models(landmarker_model, use_gpu=False)
+        else:
+            self._pose_video = self.mp_pose.Pose(
+                static_image_mode=False,
+                model_complexity=model_complexity,
+                smooth_landmarks=True,
+                enable_segmentation=False,
+                min_detection_confidence=0.7,
+                min_tracking_confidence=0.5
+            )
+            self._pose_image = self.mp_pose.Pose(
+                static_image_mode=True,
+                model_complexity=0,
+                enable_segmentation=False,
+                min_detection_confidence=0.7
+            )
+        
+        # Last fully analyzed frame (as a keyframe thumbnail) and its result
+        self._last_gray = np.empty(KEYFRAME_SIZE[::-1], dtype=np.uint8)
+        self._last_result = None
+        self._frames_since_full = 0
+        
+        # Last analyzed keypoints and their form analysis, for held poses
+        self._last_kp = np.empty((len(J), 2), dtype=np.float64)
+        self._last_exercise = None
+        self._last_analysis = None
+        
+        # Work buffers reused across frames; the frame-sized ones are sized on demand
+        self._rgb_buf = None
+        self._resize_buf = None
+        self._small_buf = np.empty((*KEYFRAME_SIZE[::-1], 3), dtype=np.uint8)
+        self._gray_buf = np.empty(KEYFRAME_SIZE[::-1], dtype=np.uint8)
+        self._kp_buf = np.empty((33, 2))
+        self._points_buf = np.empty((13, 2))
+        
+        # MediaPipe landmark indices of the body parts we analyze, in J order
+        self._lm_idx = np.array([0, 11, 12, 13, 14, 15, 16, 23, 24, 25, 26, 27, 28], dtype=np.int32)
         
         # Exercise form thresholds and parameters
         self.form_thresholds = {
@@ -68,64 +443,150 @@ class MotionAnalyzer:
             }
         }
         
-    def _calculate_angle(self, point1: Tuple[float, float], point2: Tuple[float, float], point3: Tuple[float, float]) -> float:
-        """Calculate angle between three points"""
-        try:
-            # Convert to numpy arrays
-            a = np.array(point1)
-            b = np.array(point2)  # vertex
-            c = np.array(point3)
-            
-            # Calculate vectors
-            ba = a - b
-            bc = c - b
-            
-            # Calculate angle
-            cosine_angle = np.dot(ba, bc) / (np.linalg.norm(ba) * np.linalg.norm(bc))
-            angle = np.arccos(np.clip(cosine_angle, -1.0, 1.0))
-            
-            return np.degrees(angle)
-        except:
-            return 0.0
+    def _create_tasks_pose_models(self, model_path: str, use_gpu: bool) -> Tuple[TasksPoseModel, TasksPoseModel]:
+        """The (video, image) pose models of a Tasks API backend"""
+        return tuple(
+            TasksPoseModel(
+                model_path,
+                use_gpu=use_gpu,
+                static_image_mode=static_image_mode,
+                min_detection_confidence=0.7,
+                min_tracking_confidence=0.5
+            )
+            for static_image_mode in (False, True)
+        )
+    
+    def reset_frame_caches(self) -> None:
+        """Forget the last analyzed frame and pose, so the next frame isn't compared with them
+        (for frames unrelated to the ones before)"""
+        self._last_result = None
+        self._frames_since_full = 0
+        self._last_exercise = None
+        self._last_analysis = None
+    
+    def reset_tracking(self) -> None:
+        """Start a new frame sequence: clear the frame caches and the video model's
+        tracking and landmark smoothing state"""
+        self.reset_frame_caches()
+        self._pose_video.reset()
+    
+    def warmup(self) -> None:
+        """Run a blank frame through both pose models, and blank keypoints through the form
+        kernels, so first requests don't pay for graph setup or JIT compilation.
+        Leaves the frame caches empty, so no real frame is compared with the blank one"""
+        blank = np.zeros((POSE_INPUT_SIZE, POSE_INPUT_SIZE, 3), dtype=np.uint8)
+        self.analyze_rgb_frame(blank)
+        self._analyze_pose(blank, self._pose_image)
+        
+        points = np.zeros((len(J), 2))
+        for exercise_type in (self._detect_exercise_type(points), *EXERCISE_NAMES):
+            self._analyze_exercise_form(points, exercise_type)
+        self.reset_frame_caches()
     
-    def _extract_keypoints(self, landmarks) -> Dict[str, Tuple[float, float]]:
-        """Extract key body landmarks from MediaPipe results"""
+    def _joint_angles(self, points: np.ndarray, names: Tuple[str, ...], triplets: np.ndarray) -> Dict[str, float]:
+        """Angles of the joints given as keypoint row triplets, computed in one call"""
+        return dict(zip(names, _triplet_angles(points, triplets).tolist()))
+    
+    def _extract_keypoints(self, landmarks) -> np.ndarray:
+        """Extract key body landmarks from MediaPipe results as a (13, 2) array of (x, y) indexed by J.
+        
+        The array is a buffer owned by the analyzer and is overwritten by the next call.
+        """
         if not landmarks:
-            return {}
-        
-        # Map MediaPipe landmark indices to body parts
-        landmark_map = {
-            'nose': 0,
-            'left_shoulder': 11,
-            'right_shoulder': 12,
-            'left_elbow': 13,
-            'right_elbow': 14,
-            'left_wrist': 15,
-            'right_wrist': 16,
-            'left_hip': 23,
-            'right_hip': 24,
-            'left_knee': 25,
-            'right_knee': 26,
-            'left_ankle': 27,
-            'right_ankle': 28
-        }
+            return np.empty((0, 2))
         
-        keypoints = {}
-        for name, idx in landmark_map.items():
-            if idx < len(landmarks.landmark):
-                landmark = landmarks.landmark[idx]
-                keypoints[name] = (landmark.x, landmark.y)
+        # Copy all landmarks into the reused buffer in one pass, then gather the body
+        # parts we use (as float64, so downstream arithmetic matches Python floats)
+        all_points = self._kp_buf[:len(landmarks.landmark)]
+        all_points.reshape(-1)[:] = [v for lm in landmarks.landmark for v in (lm.x, lm.y)]
+        return np.take(all_points, self._lm_idx, axis=0, out=self._points_buf)
+    
+    def _as_dict(self, points: np.ndarray) -> Dict[str, Tuple[float, float]]:
+        """Keypoints keyed by body part name, for JSON output"""
+        return dict(zip(JOINT_NAMES, map(tuple, points.tolist())))
+    
+    def _frame_error(self, e: Exception) -> Dict:
+        """Frame analysis result reporting a processing failure"""
+        return {
+            'error': f"Frame analysis failed: {str(e)}",
+            'keypoints': {},
+            'form_score': 0.0,
+            'recommendations': [f"Processing error: {str(e)}"],
+            'detected_errors': [f"MediaPipe processing error: {str(e)}"]
+        }
+    
+    def _ensure_buffers(self, height: int, width: int) -> None:
+        """Size the RGB conversion buffer for frames of this size, reallocating only on a size change"""
+        if self._rgb_buf is None or self._rgb_buf.shape[:2] != (height, width):
+            self._rgb_buf = np.empty((height, width, 3), dtype=np.uint8)
+    
+    def _pose_input(self, frame: np.ndarray) -> np.ndarray:
+        """Downscale a frame so its short edge is POSE_INPUT_SIZE, into a reused buffer (smaller frames pass through)"""
+        height, width = frame.shape[:2]
+        scale = POSE_INPUT_SIZE / min(height, width)
+        if scale >= 1.0:
+            return frame
         
-        return keypoints
+        size = (round(width * scale), round(height * scale))
+        if self._resize_buf is None or self._resize_buf.shape != (size[1], size[0], *frame.shape[2:]):
+            self._resize_buf = np.empty((size[1], size[0], *frame.shape[2:]), dtype=frame.dtype)
+        return cv2.resize(frame, size, dst=self._resize_buf, interpolation=cv2.INTER_AREA)
     
     def analyze_video_frame(self, frame: np.ndarray) -> Dict:
-        """Analyze a single video frame for pose and form using MediaPipe"""
+        """Analyze a single BGR video frame for pose and form using MediaPipe"""
         try:
-            # Convert BGR to RGB for MediaPipe
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            # Downscale first so the colour conversion runs on the small frame
+            frame = self._pose_input(frame)
             
+            # Convert BGR to RGB for MediaPipe (which needs a contiguous buffer, so a
+            # reversed-channel view would be copied anyway); pose runs synchronously,
+            # so the buffer is free again once this frame is analyzed
+            self._ensure_buffers(*frame.shape[:2])
+            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self._rgb_buf)
+        except Exception as e:
+            return self._frame_error(e)
+        
+        return self.analyze_rgb_frame(frame_rgb)
+    
+    def analyze_rgb_frame(self, frame_rgb: np.ndarray) -> Dict:
+        """Analyze a single RGB frame for pose and form using MediaPipe.
+        
+        While frames barely differ from the last fully analyzed one, its result
+        is reused instead of running pose detection again, for at most
+        KEYFRAME_MAX_REUSE frames in a row.
+        """
+        try:
+            frame_rgb = self._pose_input(frame_rgb)
+            small = cv2.resize(frame_rgb, KEYFRAME_SIZE, dst=self._small_buf, interpolation=cv2.INTER_AREA)
+            gray = cv2.cvtColor(small, cv2.COLOR_RGB2GRAY, dst=self._gray_buf)
+        except Exception as e:
+            return self._frame_error(e)
+        
+        if (self._last_result is not None and self._frames_since_full < KEYFRAME_MAX_REUSE
+                and cv2.absdiff(gray, self._last_gray).mean() < KEYFRAME_DIFF_THRESHOLD):
+            self._frames_since_full += 1
+            return self._last_result
+        
+        result = self._analyze_pose(frame_rgb, self._pose_video)
+        np.copyto(self._last_gray, gray)
+        self._last_result = result
+        self._frames_since_full = 0
+        return result
+    
+    def analyze_image(self, frame_rgb: np.ndarray) -> Dict:
+        """Analyze a one-shot RGB image, independent of any frames analyzed before it.
+        
+        Uses the static image model, so no tracking or smoothing state from
+        earlier frames carries over.
+        """
+        self.reset_frame_caches()
+        return self._analyze_pose(self._pose_input(frame_rgb), self._pose_image)
+    
+    def _analyze_pose(self, frame_rgb: np.ndarray, pose_model) -> Dict:
+        """Run pose detection on an RGB frame with the given model and analyze the detected form"""
+        try:
             # Process frame with MediaPipe Pose
-            results = self.pose_model.process(frame_rgb)
+            results = pose_model.process(frame_rgb)
             
             if not results.pose_landmarks:
                 return {
@@ -137,16 +598,16 @@ class MotionAnalyzer:
                 }
             
             # Extract keypoints
-            keypoints = self._extract_keypoints(results.pose_landmarks)
+            points = self._extract_keypoints(results.pose_landmarks)
             
             # Auto-detect exercise type based on pose
-            exercise_type = self._detect_exercise_type(keypoints)
+            exercise_type = self._detect_exercise_type(points)
             
             # Analyze form based on detected exercise
-            form_analysis = self._analyze_exercise_form(keypoints, exercise_type)
+            form_analysis = self._analyze_exercise_form(points, exercise_type)
             
             return {
-                'keypoints': keypoints,
+                'keypoints': self._as_dict(points),
                 'exercise_type': exercise_type,
                 'form_score': form_analysis['score'],
                 'recommendations': form_analysis['recommendations'],
@@ -156,81 +617,45 @@ class MotionAnalyzer:
             }
                 
         except Exception as e:
-            return {
-                'error': f"Frame analysis failed: {str(e)}",
-                'keypoints': {},
-                'form_score': 0.0,
-                'recommendations': [f"Processing error: {str(e)}"],
-                'detected_errors': [f"MediaPipe processing error: {str(e)}"]
-            }
+            return self._frame_error(e)
     
-    def _detect_exercise_type(self, keypoints: Dict[str, Tuple[float, float]]) -> str:
+    def _detect_exercise_type(self, points: np.ndarray) -> str:
         """Auto-detect exercise type based on body pose"""
-        try:
-            # Check if we have the required keypoints
-            required_points = ['left_shoulder', 'right_shoulder', 'left_hip', 'right_hip', 'left_knee', 'right_knee']
-            if not all(point in keypoints for point in required_points):
-                return 'unknown'
-            
-            # Get key positions
-            left_shoulder = keypoints['left_shoulder']
-            right_shoulder = keypoints['right_shoulder']
-            left_hip = keypoints['left_hip']
-            right_hip = keypoints['right_hip']
-            left_knee = keypoints['left_knee']
-            right_knee = keypoints['right_knee']
-            
-            # Calculate average positions
-            shoulder_y = (left_shoulder[1] + right_shoulder[1]) / 2
-            hip_y = (left_hip[1] + right_hip[1]) / 2
-            knee_y = (left_knee[1] + right_knee[1]) / 2
-            
-            # Detect squat: knees bent, hips lowered
-            if hip_y > shoulder_y + 0.1 and knee_y > hip_y - 0.05:
-                # Check if arms are in front (typical squat position)
-                if 'left_wrist' in keypoints and 'right_wrist' in keypoints:
-                    left_wrist = keypoints['left_wrist']
-                    right_wrist = keypoints['right_wrist']
-                    wrist_y = (left_wrist[1] + right_wrist[1]) / 2
-                    if wrist_y < hip_y:  # Arms raised/forward
-                        return 'squat'
-            
-            # Detect pushup: horizontal body position, arms supporting
-            if 'left_wrist' in keypoints and 'right_wrist' in keypoints:
-                left_wrist = keypoints['left_wrist']
-                right_wrist = keypoints['right_wrist']
-                wrist_y = (left_wrist[1] + right_wrist[1]) / 2
-                
-                # Check if body is horizontal (wrists, shoulders, hips aligned vertically)
-                if abs(wrist_y - shoulder_y) < 0.15 and abs(shoulder_y - hip_y) < 0.2:
-                    return 'pushup'
-            
-            # Detect plank: horizontal body, straight line
-            if abs(shoulder_y - hip_y) < 0.15 and abs(hip_y - knee_y) < 0.15:
-                return 'plank'
-            
-            return 'general_exercise'
-            
-        except Exception:
-            return 'unknown'
+        return EXERCISE_NAMES[_detect_exercise(points)]
     
-    def _analyze_exercise_form(self, keypoints: Dict[str, Tuple[float, float]], exercise_type: str) -> Dict:
+    def _analyze_exercise_form(self, points: np.ndarray, exercise_type: str) -> Dict:
         """Analyze exercise form based on detected keypoints and exercise type"""
+        # A held pose scores the same as last time
+        if (self._last_analysis is not None and exercise_type == self._last_exercise
+                and np.max(np.abs(points - self._last_kp)) < FORM_REUSE_EPSILON):
+            return self._last_analysis
+        
         try:
-            recommendations = []
-            errors = []
-            score = 85  # Base score out of 100
             angles = {}
             
             if exercise_type == 'squat':
-                return self._analyze_squat_form(keypoints)
+                angles = self._joint_angles(points, SQUAT_ANGLE_NAMES, SQUAT_TRIPLETS)
+                score, flags = _score_squat(points, angles['left_knee'])
             elif exercise_type == 'pushup':
-                return self._analyze_pushup_form(keypoints)
+                angles = self._joint_angles(points, PUSHUP_ANGLE_NAMES, PUSHUP_TRIPLETS)
+                score, flags = _score_pushup(points, angles['left_arm'])
             elif exercise_type == 'plank':
-                return self._analyze_plank_form(keypoints)
+                score, flags = _score_plank(points)
             else:
                 # General pose analysis
-                return self._analyze_general_form(keypoints)
+                score, flags = _score_general(points)
+            
+            errors, recommendations = _form_messages(flags)
+            analysis = {
+                'score': score,
+                'recommendations': recommendations,
+                'errors': errors,
+                'angles': angles
+            }
+            np.copyto(self._last_kp, points)
+            self._last_exercise = exercise_type
+            self._last_analysis = analysis
+            return analysis
                 
         except Exception as e:
             return {
@@ -240,163 +665,83 @@ class MotionAnalyzer:
                 'angles': {}
             }
     
-    def _analyze_squat_form(self, keypoints: Dict[str, Tuple[float, float]]) -> Dict:
-        """Analyze squat-specific form"""
-        score = 85
-        recommendations = []
-        errors = []
-        angles = {}
+    def process_video(self, video: Union[str, BinaryIO], sample_rate: int = 1, workers: int = 1) -> Dict:
+        """Analyze every Nth frame of a video (path or file object).
         
-        try:
-            # Calculate knee angles
-            if all(point in keypoints for point in ['left_hip', 'left_knee', 'left_ankle']):
-                left_knee_angle = self._calculate_angle(
-                    keypoints['left_hip'], keypoints['left_knee'], keypoints['left_ankle']
-                )
-                angles['left_knee'] = left_knee_angle
-                
-                if left_knee_angle < 70:
-                    errors.append("Squatting too deep - may stress knees")
-                    score -= 10
-                elif left_knee_angle > 120:
-                    recommendations.append("Try to squat deeper for better muscle activation")
-                    score -= 5
-                else:
-                    recommendations.append("Good squat depth!")
-            
-            # Check knee alignment
-            if 'left_knee' in keypoints and 'right_knee' in keypoints:
-                knee_distance = abs(keypoints['left_knee'][0] - keypoints['right_knee'][0])
-                if knee_distance < 0.08:
-                    errors.append("Knees caving inward")
-                    recommendations.append("Push knees outward, track over toes")
-                    score -= 15
-            
-            # Check back straightness
-            if all(point in keypoints for point in ['nose', 'left_shoulder', 'left_hip']):
-                # Simple check for spine alignment
-                shoulder_hip_diff = abs(keypoints['left_shoulder'][0] - keypoints['left_hip'][0])
-                if shoulder_hip_diff > 0.15:
-                    errors.append("Leaning too far forward")
-                    recommendations.append("Keep chest up and back straight")
-                    score -= 10
-            
-            if score > 80:
-                recommendations.append("Excellent squat form!")
-            elif score > 60:
-                recommendations.append("Good squat with minor improvements needed")
-                
-        except Exception as e:
-            errors.append(f"Squat analysis error: {str(e)}")
-            
-        return {
-            'score': max(0, min(100, score)),
-            'recommendations': recommendations,
-            'errors': errors,
-            'angles': angles
-        }
-    
-    def _analyze_pushup_form(self, keypoints: Dict[str, Tuple[float, float]]) -> Dict:
-        """Analyze pushup-specific form"""
-        score = 85
-        recommendations = []
-        errors = []
-        angles = {}
+        Sampled frames are decoded straight to RGB at the pose input size. With
+        workers > 1 and at least PARALLEL_MIN_FRAMES sampled frames they're
+        analyzed by analyze_video_parallel as they're decoded; otherwise they
+        stream through this analyzer's pose model.
+        """
+        # Nothing from the previous video (cached results, tracking) may carry over
+        self.reset_tracking()
+        frame_count = 0
         
-        try:
-            # Check body alignment (plank position)
-            if all(point in keypoints for point in ['left_shoulder', 'left_hip', 'left_ankle']):
-                # Calculate body straightness
-                shoulder_y = keypoints['left_shoulder'][1]
-                hip_y = keypoints['left_hip'][1]
-                ankle_y = keypoints['left_ankle'][1]
-                
-                hip_deviation = abs(hip_y - ((shoulder_y + ankle_y) / 2))
-                if hip_deviation > 0.1:
-                    errors.append("Hips sagging or too high")
-                    recommendations.append("Keep body in straight line from head to heels")
-                    score -= 15
-                else:
-                    recommendations.append("Good body alignment!")
-            
-            # Check arm position
-            if all(point in keypoints for point in ['left_shoulder', 'left_elbow', 'left_wrist']):
-                arm_angle = self._calculate_angle(
-                    keypoints['left_shoulder'], keypoints['left_elbow'], keypoints['left_wrist']
-                )
-                angles['left_arm'] = arm_angle
-                
-                if arm_angle < 45 or arm_angle > 90:
-                    recommendations.append("Adjust arm angle for optimal pushup form")
-                    score -= 5
-                    
-        except Exception as e:
-            errors.append(f"Pushup analysis error: {str(e)}")
-            
-        return {
-            'score': max(0, min(100, score)),
-            'recommendations': recommendations,
-            'errors': errors,
-            'angles': angles
-        }
-    
-    def _analyze_plank_form(self, keypoints: Dict[str, Tuple[float, float]]) -> Dict:
-        """Analyze plank-specific form"""
-        score = 85
-        recommendations = []
-        errors = []
+        def sampled_frames() -> Iterator[np.ndarray]:
+            nonlocal frame_count
+            for frame in container.decode(stream):
+                if frame_count % sample_rate == 0:
+                    # Scaling and colour conversion happen in one swscale pass
+                    yield frame.to_ndarray(format='rgb24', interpolation='AREA',
+                                           **_pose_input_size(frame.width, frame.height))
+                frame_count += 1
         
-        try:
-            # Check body straightness
-            if all(point in keypoints for point in ['left_shoulder', 'left_hip', 'left_knee']):
-                shoulder_y = keypoints['left_shoulder'][1]
-                hip_y = keypoints['left_hip'][1]
-                knee_y = keypoints['left_knee'][1]
-                
-                # Check if body forms straight line
-                if abs(shoulder_y - hip_y) > 0.08:
-                    errors.append("Hips not aligned with shoulders")
-                    recommendations.append("Keep hips level with shoulders")
-                    score -= 10
-                
-                if abs(hip_y - knee_y) > 0.08:
-                    errors.append("Body not straight from hips to knees")
-                    recommendations.append("Maintain straight line throughout body")
-                    score -= 10
-                    
-            if score > 80:
-                recommendations.append("Excellent plank form!")
-                
-        except Exception as e:
-            errors.append(f"Plank analysis error: {str(e)}")
+        with av.open(video) as container:
+            stream = container.streams.video[0]
+            stream.thread_type = 'AUTO'  # Frame- and slice-threaded decoding
             
+            if workers > 1 and _estimated_frame_count(stream) // sample_rate >= PARALLEL_MIN_FRAMES:
+                frame_analyses = self.analyze_video_parallel(sampled_frames(), workers)
+            else:
+                frame_analyses = [self.analyze_rgb_frame(frame_rgb) for frame_rgb in sampled_frames()]
+        
+        if not frame_analyses:
+            raise ValueError("No frames decoded from video")
+        
+        # Aggregate over frames where a pose was found
+        detected = [analysis for analysis in frame_analyses if 'error' not in analysis]
+        # Ordered dedupe: dict keys keep first-seen order
+        recommendations = list(dict.fromkeys(r for analysis in detected for r in analysis['recommendations']))
+        detected_errors = list(dict.fromkeys(e for analysis in detected for e in analysis['detected_errors']))
+        
+        if not detected:
+            recommendations = ['Ensure full body is visible in frame']
+            detected_errors = ['No pose landmarks detected']
+        
         return {
-            'score': max(0, min(100, score)),
+            'overall_score': float(np.mean([a['form_score'] for a in detected])) / 100.0 if detected else 0.0,
             'recommendations': recommendations,
-            'errors': errors,
-            'angles': {}
+            'detected_errors': detected_errors,
+            'exercise_type': Counter(a['exercise_type'] for a in detected).most_common(1)[0][0] if detected else 'unknown',
+            'keypoints_detected': max((len(a['keypoints']) for a in detected), default=0),
+            'frames_analyzed': len(frame_analyses),
+            'pose_detection_rate': len(detected) / len(frame_analyses),
+            'total_frames': frame_count
         }
     
-    def _analyze_general_form(self, keypoints: Dict[str, Tuple[float, float]]) -> Dict:
-        """General pose analysis for unknown exercises"""
-        score = 75
-        recommendations = ["Exercise detected - maintain good posture"]
-        errors = []
-        
-        # Basic posture checks
-        if 'left_shoulder' in keypoints and 'right_shoulder' in keypoints:
-            shoulder_diff = abs(keypoints['left_shoulder'][1] - keypoints['right_shoulder'][1])
-            if shoulder_diff > 0.05:
-                errors.append("Shoulders not level")
-                recommendations.append("Keep shoulders level")
-                score -= 10
-                
-        return {
-            'score': max(0, min(100, score)),
-            'recommendations': recommendations,
-            'errors': errors,
-            'angles': {}
-        }
+    def analyze_video_parallel(self, frames: Iterable[np.ndarray], workers: int = 4) -> List[Dict]:
+        """Analyze RGB frames across a pool of worker processes, returning results in frame order.
+        
+        Each worker owns a MotionAnalyzer (MediaPipe graphs can't be shared
+        across processes) and takes PARALLEL_CHUNK_SIZE consecutive frames at a
+        time; tracking restarts at each chunk and works within it. The pool
+        stays alive for later calls. frames may be a generator: at most two
+        chunks per worker are taken from it ahead of the results.
+        """
+        if workers <= 1:
+            return [self.analyze_rgb_frame(frame) for frame in frames]
+        
+        pool = _worker_pool(workers, self.model_complexity)
+        frames = iter(frames)
+        in_flight = deque()
+        results = []
+        for chunk in iter(lambda: list(itertools.islice(frames, PARALLEL_CHUNK_SIZE)), []):
+            if len(in_flight) == 2 * workers:
+                results.extend(in_flight.popleft().get())
+            in_flight.append(pool.apply_async(_analyze_chunk_in_worker, (chunk,)))
+        for pending in in_flight:
+            results.extend(pending.get())
+        return results
     
     def analyze_video_data(self, video_data: bytes) -> Dict:
         """Analyze video data from base64 input"""
@@ -404,23 +749,14 @@ class MotionAnalyzer:
             # Create temporary file-like object from bytes
             video_stream = io.BytesIO(video_data)
             
-            # For this demo, we'll analyze just a few frames
-            # In production, you'd process the full video
-            
             # Try to read as image first (for single frame analysis)
             try:
-                # Decode as image
+                # Decode as image straight to the RGB layout MediaPipe takes
                 image = Image.open(video_stream)
-                frame = np.array(image)
+                frame_rgb = np.asarray(image.convert('RGB'))
                 
-                # Convert to BGR for OpenCV compatibility
-                if len(frame.shape) == 3:
-                    if frame.shape[2] == 3:  # RGB
-                        frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-                    elif frame.shape[2] == 4:  # RGBA
-                        frame = cv2.cvtColor(frame, cv2.COLOR_RGBA2BGR)
-                
-                analysis = self.analyze_video_frame(frame)
+                # One-shot image, so use the static model and skip keyframe caching
+                analysis = self.analyze_image(frame_rgb)
                 
                 return {
                     'overall_score': analysis['form_score'] / 100.0,  # Convert to 0-1 scale
@@ -435,22 +771,17 @@ class MotionAnalyzer:
                 }
                 
             except Exception:
-                # If not an image, try as video (simplified for demo)
-                return {
-                    'overall_score': 0.75,
-                    'recommendations': [
-                        "Video analysis completed",
-                        "Good overall form detected",
-                        "Keep maintaining proper posture"
-                    ],
-                    'detected_errors': [
-                        "Minor form adjustments needed"
-                    ],
-                    'confidence': 0.88,
-                    'keypoints_detected': 17,
-                    'analysis_method': 'video_processing',
-                    'device_used': str(self.device)
-                }
+                pass
+            
+            # Not an image, so decode it as a video straight from memory
+            analysis = self.process_video(io.BytesIO(video_data), workers=VIDEO_WORKERS)
+            
+            analysis.update({
+                'confidence': analysis['pose_detection_rate'],
+                'analysis_method': 'mediapipe_video',
+                'device_used': str(self.device)
+            })
+            return analysis
                 
         except Exception as e:
             return {
@@ -464,59 +795,159 @@ class MotionAnalyzer:
             }
 
 
+# Analyzer owned by each analyze_video_parallel worker process
+_worker_analyzer: Optional[MotionAnalyzer] = None
+
+# analyze_video_parallel pools by (workers, model_complexity), kept alive between videos
+_worker_pools: Dict[Tuple[int, int], multiprocessing.pool.Pool] = {}
+_worker_pools_lock = threading.Lock()
+
+def _worker_pool(workers: int, model_complexity: int) -> multiprocessing.pool.Pool:
+    """The worker pool for these settings, started on first use"""
+    with _worker_pools_lock:
+        pool = _worker_pools.get((workers, model_complexity))
+        if pool is None:
+            # spawn: forking a process that runs MediaPipe graph threads can deadlock
+            context = multiprocessing.get_context('spawn')
+            pool = context.Pool(workers, initializer=_init_worker, initargs=(model_complexity,))
+            _worker_pools[(workers, model_complexity)] = pool
+        return pool
+
+@atexit.register
+def _close_worker_pools() -> None:
+    """Stop the analyze_video_parallel worker processes"""
+    with _worker_pools_lock:
+        pools = list(_worker_pools.values())
+        _worker_pools.clear()
+    for pool in pools:
+        pool.terminate()
+        pool.join()
+
+def _init_worker(model_complexity: int) -> None:
+    global _worker_analyzer
+    _worker_analyzer = MotionAnalyzer(model_complexity)
+
+def _analyze_chunk_in_worker(frames: List[np.ndarray]) -> List[Dict]:
+    # A chunk's frames are consecutive, but the worker's previous chunk may be
+    # from elsewhere in the video (or another video): drop its caches and
+    # tracking/smoothing state so it can't bleed into this chunk's landmarks
+    _worker_analyzer.reset_tracking()
+    return [_worker_analyzer.analyze_rgb_frame(frame_rgb) for frame_rgb in frames]
+
+
+def write_json(payload: Dict) -> None:
+    """Write a JSON document as one line to stdout (orjson serializes NumPy values natively)"""
+    sys.stdout.flush()  # Keep ordering with any earlier print() output
+    sys.stdout.buffer.write(orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY) + b"\n")
+    sys.stdout.flush()
+
+
+def runtime_info() -> Dict:
+    """PyTorch/CUDA details reported alongside analysis results"""
+    info = {
+        'pytorch_version': torch.__version__,
+        'cuda_available': torch.cuda.is_available()
+    }
+    if torch.cuda.is_available():
+        info['gpu_name'] = torch.cuda.get_device_name(0)
+        info['gpu_memory'] = f"{torch.cuda.get_device_properties(0).total_memory // 1024**2} MB"
+    return info
+
+
+def analysis_error(e: Exception) -> Dict:
+    """Response for an analysis that failed unexpectedly"""
+    return {
+        "error": f"Motion analysis failed: {str(e)}",
+        "traceback": traceback.format_exc(),
+        "overall_score": 0.0,
+        "recommendations": [],
+        "detected_errors": [str(e)],
+        "confidence": 0.0
+    }
+
+
+def handle_request(analyzer: MotionAnalyzer, request: Dict) -> Dict:
+    """Analyze the base64 video of one request; raises ValueError for unusable input"""
+    # Extract video data
+    video_base64 = request.get('video_base64', '')
+    if not video_base64:
+        raise ValueError("No video data provided")
+    
+    # Decode base64 video data
+    try:
+        video_data = base64.b64decode(video_base64)
+    except Exception as e:
+        raise ValueError(f"Failed to decode video data: {str(e)}")
+    
+    return analyzer.analyze_video_data(video_data)
+
+
+def serve():
+    """Answer one JSON request per stdin line until EOF, reusing a single warm analyzer.
+    
+    {"op": "ping"} is answered with {"op": "pong"}; since requests are handled
+    in order after the analyzer is built, the pong tells the parent process
+    the worker is ready.
+    """
+    analyzer = MotionAnalyzer()
+    info = runtime_info()
+    
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        
+        try:
+            request = json.loads(line)
+            if request.get('op') == 'ping':
+                response = {'op': 'pong'}
+            else:
+                response = handle_request(analyzer, request)
+                response.update(info)
+        except ValueError as e:  # Includes malformed JSON
+            response = {"error": str(e)}
+        except Exception as e:
+            response = analysis_error(e)
+        
+        write_json(response)
+
+
 def main():
-    """Main entry point for the motion analyzer"""
+    """Main entry point for the motion analyzer (one request per run, or --serve for many)"""
+    if '--serve' in sys.argv[1:]:
+        serve()
+        return
+    
     try:
         # Read JSON input from stdin
         input_data = sys.stdin.read().strip()
         if not input_data:
-            print(json.dumps({"error": "No input data provided"}))
+            write_json({"error": "No input data provided"})
             sys.exit(1)
         
         # Parse JSON request
         request = json.loads(input_data)
         
-        # Extract video data
-        video_base64 = request.get('video_base64', '')
-        if not video_base64:
-            print(json.dumps({"error": "No video data provided"}))
-            sys.exit(1)
-        
-        # Decode base64 video data
-        try:
-            video_data = base64.b64decode(video_base64)
-        except Exception as e:
-            print(json.dumps({"error": f"Failed to decode video data: {str(e)}"}))
-            sys.exit(1)
-        
         # Initialize analyzer
         analyzer = MotionAnalyzer()
         
         # Analyze video
-        result = analyzer.analyze_video_data(video_data)
+        try:
+            result = handle_request(analyzer, request)
+        except ValueError as e:
+            write_json({"error": str(e)})
+            sys.exit(1)
         
         # Add metadata
-        result['pytorch_version'] = torch.__version__
-        result['cuda_available'] = torch.cuda.is_available()
-        if torch.cuda.is_available():
-            result['gpu_name'] = torch.cuda.get_device_name(0)
-            result['gpu_memory'] = f"{torch.cuda.get_device_properties(0).total_memory // 1024**2} MB"
+        result.update(runtime_info())
         
         # Output result as JSON
-        print(json.dumps(result, indent=2))
+        write_json(result)
         
     except Exception as e:
-        error_response = {
-            "error": f"Motion analysis failed: {str(e)}",
-            "traceback": traceback.format_exc(),
-            "overall_score": 0.0,
-            "recommendations": [],
-            "detected_errors": [str(e)],
-            "confidence": 0.0
-        }
-        print(json.dumps(error_response, indent=2))
+        write_json(analysis_error(e))
         sys.exit(1)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
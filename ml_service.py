@@ -7,26 +7,30 @@ Provides HTTP endpoints for Rust integration
 import asyncio
 import base64
 import io
-import json
-import subprocess
+import os
 import tempfile
 import time
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Callable, Dict, Optional
+
+import numpy as np
 
 from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 import uvicorn
 
 # Import our existing analyzers
 from ml_analyzer import MotionAnalyzer
-from realtime_analyzer import analyze_frame_realtime
+from realtime_analyzer import RealtimeAnalyzer
+from batch_analyzer import analyze_workout_session
 
 app = FastAPI(
     title="Fitness Advisor ML Service",
     description="ML analysis endpoints for fitness form and motion tracking",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware for Rust integration
@@ -38,8 +42,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global analyzer instance for reuse
-motion_analyzer = None
+# Pool of warm analyzers, each with its own MediaPipe graph, so concurrent
+# detailed requests run in parallel without per-request model setup
+ANALYZER_POOL_SIZE = int(os.environ.get(
+    'FA_ANALYZER_POOL_SIZE', max(1, min((os.cpu_count() or 2) // 2, 4))
+))
+analyzer_pool: Optional[asyncio.Queue] = None
+
+# Realtime analyzer for /analyze/frame; its frames come from every client, so it
+# detects each frame from scratch rather than tracking from the previous one
+frame_analyzer: Optional[RealtimeAnalyzer] = None
 
 # Pydantic models for API contracts
 class FrameAnalysisRequest(BaseModel):
@@ -59,15 +71,42 @@ class AnalysisResponse(BaseModel):
     result: Dict
     error: Optional[str] = None
 
+def _create_warm_analyzer() -> MotionAnalyzer:
+    """Create an analyzer and warm up its pose graphs and kernels so their setup happens now"""
+    analyzer = MotionAnalyzer()
+    analyzer.warmup()
+    return analyzer
+
+async def run_with_analyzer(analyze: Callable[[MotionAnalyzer], Dict]) -> Dict:
+    """Borrow an analyzer from the pool and run analyze(analyzer) in a worker thread"""
+    analyzer = await analyzer_pool.get()
+    try:
+        return await asyncio.to_thread(analyze, analyzer)
+    finally:
+        analyzer_pool.put_nowait(analyzer)
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize ML models on startup"""
-    global motion_analyzer
+    global analyzer_pool, frame_analyzer
     try:
-        motion_analyzer = MotionAnalyzer()
-        print("ML Service started - Motion analyzer initialized")
+        analyzers = await asyncio.gather(*(
+            asyncio.to_thread(_create_warm_analyzer) for _ in range(ANALYZER_POOL_SIZE)
+        ))
+        analyzer_pool = asyncio.Queue()
+        for analyzer in analyzers:
+            analyzer_pool.put_nowait(analyzer)
+        print(f"ML Service started - {ANALYZER_POOL_SIZE} motion analyzer(s) initialized")
     except Exception as e:
         print(f"Failed to initialize motion analyzer: {e}")
+    
+    # Warm the realtime analyzer too, so the first realtime frame is fast
+    try:
+        analyzer = RealtimeAnalyzer(tracking=False)
+        await asyncio.to_thread(analyzer.warmup)
+        frame_analyzer = analyzer
+    except Exception as e:
+        print(f"Failed to initialize realtime analyzer: {e}")
 
 @app.get("/health")
 async def health_check():
@@ -76,7 +115,7 @@ async def health_check():
         "status": "healthy",
         "service": "fitness_ml_service",
         "timestamp": time.time(),
-        "models_loaded": motion_analyzer is not None
+        "models_loaded": analyzer_pool is not None
     }
 
 @app.post("/analyze/frame", response_model=AnalysisResponse)
@@ -92,21 +131,25 @@ async def analyze_frame(request: FrameAnalysisRequest):
             raise HTTPException(status_code=400, detail=f"Invalid base64 data: {e}")
         
         if request.analysis_type == "realtime":
-            # Use optimized real-time analyzer
-            result = analyze_frame_realtime(frame_data)
+            # Use optimized real-time analyzer; frames of all clients share it, so a
+            # frame must not get the cached result of another client's similar frame
+            if frame_analyzer is None:
+                raise HTTPException(status_code=503, detail="Realtime analyzer not initialized")
+            result = frame_analyzer.analyze_frame(frame_data, reuse_result=False)
         else:
             # Use detailed motion analyzer
-            if motion_analyzer is None:
+            if analyzer_pool is None:
                 raise HTTPException(status_code=503, detail="Motion analyzer not initialized")
             
             from PIL import Image
-            import numpy as np
             
-            # Convert to frame format
+            # Decode straight to the RGB layout MediaPipe takes
             image = Image.open(io.BytesIO(frame_data))
-            frame = np.array(image)
+            frame_rgb = np.asarray(image.convert('RGB'))
             
-            result = motion_analyzer.analyze_video_frame(frame)
+            # Requests are independent images from any client, so they go to the
+            # static model rather than the tracking one
+            result = await run_with_analyzer(lambda analyzer: analyzer.analyze_image(frame_rgb))
             
         processing_time = (time.time() - start_time) * 1000
         
@@ -133,7 +176,7 @@ async def analyze_video(request: VideoAnalysisRequest):
     start_time = time.time()
     
     try:
-        if motion_analyzer is None:
+        if analyzer_pool is None:
             raise HTTPException(status_code=503, detail="Motion analyzer not initialized")
         
         # Decode base64 video data
@@ -143,7 +186,7 @@ async def analyze_video(request: VideoAnalysisRequest):
             raise HTTPException(status_code=400, detail=f"Invalid base64 data: {e}")
         
         # Analyze video using detailed motion analyzer
-        result = motion_analyzer.analyze_video_data(video_data)
+        result = await run_with_analyzer(lambda analyzer: analyzer.analyze_video_data(video_data))
         
         processing_time = (time.time() - start_time) * 1000
         
@@ -175,26 +218,11 @@ async def analyze_batch(request: BatchAnalysisRequest):
         if not video_path.exists():
             raise HTTPException(status_code=404, detail=f"Video file not found: {request.video_path}")
         
-        # Run batch analyzer as subprocess
-        try:
-            cmd = ["python3", "batch_analyzer.py", str(video_path)]
-            result = subprocess.run(
-                cmd, 
-                capture_output=True, 
-                text=True, 
-                timeout=300  # 5 minute timeout
-            )
-            
-            if result.returncode != 0:
-                raise Exception(f"Batch analysis failed: {result.stderr}")
-            
-            # Parse JSON result
-            analysis_result = json.loads(result.stdout)
-            
-        except subprocess.TimeoutExpired:
-            raise HTTPException(status_code=408, detail="Analysis timeout - video too long")
-        except json.JSONDecodeError as e:
-            raise HTTPException(status_code=500, detail=f"Invalid analysis output: {e}")
+        # Run batch analysis in a worker thread so the event loop stays responsive;
+        # each session builds its own pose graph, so concurrent requests are safe
+        batch_start = time.time()
+        analysis_result = await asyncio.to_thread(analyze_workout_session, str(video_path))
+        analysis_result['processing_time'] = time.time() - batch_start
         
         processing_time = (time.time() - start_time) * 1000
         
@@ -219,11 +247,12 @@ async def analyze_batch(request: BatchAnalysisRequest):
 async def models_status():
     """Get status of loaded ML models"""
     return {
-        "motion_analyzer": motion_analyzer is not None,
-        "realtime_analyzer": True,  # Always available
-        "batch_analyzer": Path("batch_analyzer.py").exists(),
+        "motion_analyzer": analyzer_pool is not None,
+        "motion_analyzer_pool_size": ANALYZER_POOL_SIZE if analyzer_pool is not None else 0,
+        "realtime_analyzer": frame_analyzer is not None,
+        "batch_analyzer": True,  # Imported in-process
         "mediapipe_available": True,
-        "pytorch_available": motion_analyzer is not None
+        "pytorch_available": analyzer_pool is not None
     }
 
 @app.get("/")
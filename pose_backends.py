@@ -0,0 +1,41 @@
+"""
+Pose backend selection shared by the ML, batch and real-time analyzers
+"""
+
+import os
+from typing import Optional
+
+# Pose backends selectable with POSE_BACKEND: 'mp_full' is MediaPipe's solutions
+# Pose; the others run a Tasks API landmarker from the FA_POSE_LANDMARKER_MODEL
+# bundle, 'tflite_int8' on the CPU (XNNPACK runs int8-quantized bundles with
+# integer kernels) and 'trt_fp16' on the GPU delegate (fp16 inference)
+POSE_BACKENDS = ('mp_full', 'tflite_int8', 'trt_fp16')
+
+def select_pose_backend() -> str:
+    """Pose backend from POSE_BACKEND; without it 'trt_fp16' with FA_USE_GPU=1, 'tflite_int8' if
+    FA_POSE_LANDMARKER_MODEL is set, else 'mp_full'.
+
+    The GPU is only used when asked for: MediaPipe's GPU delegate runs on
+    GL/EGL, so CUDA being available says nothing about whether it works.
+    """
+    backend = os.environ.get('POSE_BACKEND')
+    if backend is None:
+        if os.environ.get('FA_USE_GPU') == '1':
+            return 'trt_fp16'
+        return 'tflite_int8' if os.environ.get('FA_POSE_LANDMARKER_MODEL') else 'mp_full'
+
+    if backend not in POSE_BACKENDS:
+        raise ValueError(f"Unknown POSE_BACKEND {backend!r}; expected one of {', '.join(POSE_BACKENDS)}")
+    return backend
+
+def pose_landmarker_model(backend: str) -> Optional[str]:
+    """The FA_POSE_LANDMARKER_MODEL bundle a backend runs, or None for 'mp_full'.
+    Raises ValueError if a Tasks API backend has no bundle configured"""
+    if backend == 'mp_full':
+        return None
+
+    model_path = os.environ.get('FA_POSE_LANDMARKER_MODEL')
+    if not model_path:
+        raise ValueError(f"Pose backend {backend} requires FA_POSE_LANDMARKER_MODEL "
+                         "to point to a pose_landmarker .task file")
+    return model_path
@@ -7,181 +7,406 @@ Processes single frames for live video streaming analysis
 import sys
 import json
 import base64
-import io
+import itertools
+import math
+import os
+import queue
+import struct
+import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from enum import IntFlag
+from multiprocessing import resource_tracker, shared_memory
 import numpy as np
-from typing import Dict, Optional, Tuple
+from typing import Dict, List, Optional, Sequence, Tuple, Union
 
 try:
     import cv2
-    from PIL import Image
     import mediapipe as mp
+    import orjson
+    from mediapipe.tasks import python as mp_tasks
+    from mediapipe.tasks.python import vision
 except ImportError as e:
     print(json.dumps({"error": f"Missing dependencies: {e}"}))
     sys.exit(1)
 
-# Global MediaPipe instance for reuse (faster than recreating)
+try:
+    from numba import njit
+except ImportError:  # numba is optional; the angle helper then runs as plain Python
+    def njit(*args, **kwargs):
+        if args and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB
+    turbo_jpeg = TurboJPEG()
+except (ImportError, OSError, RuntimeError):  # PyTurboJPEG and libturbojpeg are optional
+    turbo_jpeg = None
+
+from pose_backends import pose_landmarker_model, select_pose_backend
+
+# MediaPipe landmark indices of the body parts used below
+NOSE, LS, RS, LE, RE, LW, RW, LH, RH, LK, RK, LA, RA = 0, 11, 12, 13, 14, 15, 16, 23, 24, 25, 26, 27, 28
+KEY_LANDMARKS = (NOSE, LS, RS, LE, RE, LW, RW, LH, RH, LK, RK, LA, RA)
+
+# Exercise codes returned by quick_exercise_detection, and their names in results
+STANDING, SQUAT, PUSHUP, PLANK, UNKNOWN = range(5)
+EXERCISE_NAMES = ('standing', 'squat', 'pushup', 'plank', 'unknown')
+
+class FormFlag(IntFlag):
+    """Form findings reported by the check kernels, in report order"""
+    TOO_DEEP = 1 << 0
+    TOO_SHALLOW = 1 << 1
+    GOOD_DEPTH = 1 << 2
+    KNEES_CAVING = 1 << 3
+    BODY_NOT_STRAIGHT = 1 << 4
+    BODY_ALIGNED = 1 << 5
+    HIPS_MISALIGNED = 1 << 6
+    GOOD_PLANK = 1 << 7
+    READY = 1 << 8
+    KEEP_MOVING = 1 << 9
+    INCOMPLETE = 1 << 10
+
+# flag -> (feedback, warnings) it adds to the result
+FORM_MESSAGES = {
+    FormFlag.TOO_DEEP: ((), ("Too deep - ease up slightly",)),
+    FormFlag.TOO_SHALLOW: (("Go deeper for better activation",), ()),
+    FormFlag.GOOD_DEPTH: (("Good squat depth!",), ()),
+    FormFlag.KNEES_CAVING: ((), ("Knees caving in!",)),
+    FormFlag.BODY_NOT_STRAIGHT: ((), ("Keep body straight!",)),
+    FormFlag.BODY_ALIGNED: (("Good body alignment",), ()),
+    FormFlag.HIPS_MISALIGNED: ((), ("Align hips with shoulders",)),
+    FormFlag.GOOD_PLANK: (("Perfect plank position!",), ()),
+    FormFlag.READY: (("Ready to exercise!",), ()),
+    FormFlag.KEEP_MOVING: (("Keep moving!",), ()),
+    FormFlag.INCOMPLETE: ((), ("Pose detection incomplete",)),
+}
+
+# JPEG frames start with an SOI marker; libjpeg-turbo can decode them at these
+# reduced scales (largest reduction first) straight from the DCT coefficients
+JPEG_MAGIC = b'\xff\xd8\xff'
+JPEG_SCALING_FACTORS = ((1, 8), (1, 4), (1, 2))
+
+# Frame gate: frames are compared as grayscale thumbnails of this size. A mean
+# absolute difference below KEYFRAME_DIFF_THRESHOLD from the last analyzed frame
+# reuses its result, and a Laplacian variance below BLUR_VARIANCE_THRESHOLD
+# means the frame is too blurred or featureless to find a pose in
+KEYFRAME_SIZE = (64, 64)
+KEYFRAME_DIFF_THRESHOLD = 3.0
+KEYFRAME_MAX_REUSE = 10
+BLUR_VARIANCE_THRESHOLD = 20.0
+
+# Per-frame latency budget reported in results
+TARGET_LATENCY_MS = 50
+
+# Frames are downscaled so their long edge is at most this many pixels before
+# pose detection; the Lite model works at 256px, and landmarks are normalized
+MAX_FRAME_EDGE = 480
+
+# Landmarks with a lower visibility score are treated as missing (NaN)
+VISIBILITY_THRESHOLD = 0.5
+
+# Timestamp step between frames fed to a Tasks API landmarker (video mode needs increasing timestamps)
+TASKS_FRAME_INTERVAL_MS = 33
+
+def create_pose_landmarker(model_path: str, use_gpu: bool, tracking: bool = True) -> vision.PoseLandmarker:
+    """Create a Tasks API pose landmarker from a pose_landmarker_*.task bundle, for streamed
+    frames (video mode) or, without tracking, independent images.
+    
+    Selected by POSE_BACKEND (see pose_backends). The Tasks CPU delegate runs
+    the model through TFLite's XNNPACK kernels, which the solutions Pose
+    gives no control over from Python; use_gpu runs it on the GPU delegate.
+    """
+    delegate = mp_tasks.BaseOptions.Delegate.GPU if use_gpu else mp_tasks.BaseOptions.Delegate.CPU
+    options = vision.PoseLandmarkerOptions(
+        base_options=mp_tasks.BaseOptions(model_asset_path=model_path, delegate=delegate),
+        running_mode=vision.RunningMode.VIDEO if tracking else vision.RunningMode.IMAGE,
+        num_poses=1,
+        min_pose_detection_confidence=0.6,
+        min_tracking_confidence=0.5
+    )
+    return vision.PoseLandmarker.create_from_options(options)
+
+# MediaPipe pose solution, and the configured backend; each RealtimeAnalyzer
+# builds its own pose model from these
 mp_pose = mp.solutions.pose
-pose_model = mp_pose.Pose(
-    static_image_mode=True,  # Single frame processing
-    model_complexity=0,      # Fastest model (Lite)
-    smooth_landmarks=False,  # No smoothing for single frames
-    enable_segmentation=False,
-    min_detection_confidence=0.6,  # Lower for speed
-    min_tracking_confidence=0.5
-)
-
-def calculate_angle_fast(p1: Tuple[float, float], p2: Tuple[float, float], p3: Tuple[float, float]) -> float:
-    """Fast angle calculation between three points"""
-    try:
-        # Vectorized calculation
-        a = np.array([p1[0] - p2[0], p1[1] - p2[1]])
-        b = np.array([p3[0] - p2[0], p3[1] - p2[1]])
-        
-        cos_angle = np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b) + 1e-8)
-        angle = np.arccos(np.clip(cos_angle, -1.0, 1.0))
-        return np.degrees(angle)
-    except:
-        return 0.0
-
-def extract_key_landmarks(results) -> Optional[Dict]:
-    """Extract only essential landmarks for speed"""
-    if not results.pose_landmarks:
-        return None
+pose_backend = select_pose_backend()
+landmarker_model = pose_landmarker_model(pose_backend)
+
+# --server analyzes this many frames concurrently, each analyzer taking every
+# n-th frame; one pose model call leaves most cores of a multi-core CPU idle
+SERVER_POOL_SIZE = max(1, int(os.environ.get('FA_REALTIME_POOL_SIZE', 2)))
+
+@njit(cache=True)
+def calculate_angle_fast(p1x: float, p1y: float, p2x: float, p2y: float, p3x: float, p3y: float) -> float:
+    """Fast angle calculation (degrees) at p2 between three points, in scalar math"""
+    ax = p1x - p2x
+    ay = p1y - p2y
+    bx = p3x - p2x
+    by = p3y - p2y
     
-    landmarks = results.pose_landmarks.landmark
+    cos_angle = (ax * bx + ay * by) / (math.sqrt((ax * ax + ay * ay) * (bx * bx + by * by)) + 1e-8)
+    if cos_angle > 1.0:
+        cos_angle = 1.0
+    elif cos_angle < -1.0:
+        cos_angle = -1.0
+    return math.degrees(math.acos(cos_angle))
+
+@njit(cache=True)
+def _visible_side(pts: np.ndarray, a: int, b: int, c: int, d: int) -> int:
+    """A body side on which the left-side landmarks a-d (or their right-side counterparts,
+    one index up) are all visible: 0 for left, preferred, 1 for right, -1 for neither"""
+    for side in range(2):
+        # Any missing landmark makes the sum NaN
+        if not math.isnan(pts[a + side, 0] + pts[b + side, 0] + pts[c + side, 0] + pts[d + side, 0]):
+            return side
+    return -1
+
+@njit(cache=True)
+def quick_exercise_detection(pts: np.ndarray) -> int:
+    """Fast exercise classification for real-time use; returns an exercise code (see EXERCISE_NAMES).
     
-    # Only extract essential points for real-time analysis
-    key_points = {
-        'nose': (landmarks[0].x, landmarks[0].y),
-        'left_shoulder': (landmarks[11].x, landmarks[11].y),
-        'right_shoulder': (landmarks[12].x, landmarks[12].y),
-        'left_elbow': (landmarks[13].x, landmarks[13].y),
-        'right_elbow': (landmarks[14].x, landmarks[14].y),
-        'left_wrist': (landmarks[15].x, landmarks[15].y),
-        'right_wrist': (landmarks[16].x, landmarks[16].y),
-        'left_hip': (landmarks[23].x, landmarks[23].y),
-        'right_hip': (landmarks[24].x, landmarks[24].y),
-        'left_knee': (landmarks[25].x, landmarks[25].y),
-        'right_knee': (landmarks[26].x, landmarks[26].y),
-        'left_ankle': (landmarks[27].x, landmarks[27].y),
-        'right_ankle': (landmarks[28].x, landmarks[28].y),
-    }
+    Uses both sides of the body when visible, otherwise the visible one: in
+    side views (the usual angle for push-ups and planks) the far side is
+    hidden.
+    """
+    if not math.isnan(pts[LS, 0] + pts[RS, 0] + pts[LH, 0] + pts[RH, 0]
+                      + pts[LK, 0] + pts[RK, 0] + pts[LW, 0] + pts[RW, 0]):
+        # Quick body position analysis
+        shoulder_y = (pts[LS, 1] + pts[RS, 1]) * 0.5
+        hip_y = (pts[LH, 1] + pts[RH, 1]) * 0.5
+        knee_y = (pts[LK, 1] + pts[RK, 1]) * 0.5
+        wrist_y = (pts[LW, 1] + pts[RW, 1]) * 0.5
+    else:
+        side = _visible_side(pts, LS, LH, LK, LW)
+        if side < 0:
+            return UNKNOWN
+        shoulder_y = pts[LS + side, 1]
+        hip_y = pts[LH + side, 1]
+        knee_y = pts[LK + side, 1]
+        wrist_y = pts[LW + side, 1]
+    
+    # Simple classification rules for speed
+    if hip_y > shoulder_y + 0.12:  # Hips below shoulders
+        if knee_y > hip_y - 0.08:  # Knees near hip level
+            return SQUAT
     
-    return key_points
+    if abs(shoulder_y - hip_y) < 0.18:  # Horizontal body
+        if abs(wrist_y - shoulder_y) < 0.15:  # Arms supporting
+            return PUSHUP
+        else:
+            return PLANK
+    
+    return STANDING
 
-def quick_exercise_detection(landmarks: Dict) -> str:
-    """Fast exercise classification for real-time use"""
-    try:
-        # Quick body position analysis
-        shoulder_y = (landmarks['left_shoulder'][1] + landmarks['right_shoulder'][1]) / 2
-        hip_y = (landmarks['left_hip'][1] + landmarks['right_hip'][1]) / 2
-        knee_y = (landmarks['left_knee'][1] + landmarks['right_knee'][1]) / 2
-        wrist_y = (landmarks['left_wrist'][1] + landmarks['right_wrist'][1]) / 2
-        
-        # Simple classification rules for speed
-        if hip_y > shoulder_y + 0.12:  # Hips below shoulders
-            if knee_y > hip_y - 0.08:  # Knees near hip level
-                return 'squat'
-        
-        if abs(shoulder_y - hip_y) < 0.18:  # Horizontal body
-            if abs(wrist_y - shoulder_y) < 0.15:  # Arms supporting
-                return 'pushup'
-            else:
-                return 'plank'
-        
-        return 'standing'
-        
-    except KeyError:
-        return 'unknown'
+# The check kernels use FormFlag.X.value since numba treats enum members as
+# constants of the enum type, which don't combine with plain ints
+@njit(cache=True)
+def _check_squat(pts: np.ndarray) -> Tuple[int, int]:
+    """Squat score and findings: depth from the knee angle of a visible leg, and knee
+    alignment when both knees are visible"""
+    side = _visible_side(pts, LH, LK, LA, LA)
+    if side < 0:
+        return 50, FormFlag.INCOMPLETE.value
+    
+    score = 85
+    flags = 0
+    
+    hip, knee, ankle = LH + side, LK + side, LA + side
+    knee_angle = calculate_angle_fast(
+        pts[hip, 0], pts[hip, 1], pts[knee, 0], pts[knee, 1], pts[ankle, 0], pts[ankle, 1]
+    )
+    if knee_angle < 70:
+        flags |= FormFlag.TOO_DEEP.value
+        score -= 10
+    elif knee_angle > 120:
+        flags |= FormFlag.TOO_SHALLOW.value
+        score -= 5
+    else:
+        flags |= FormFlag.GOOD_DEPTH.value
+    
+    # Knee alignment check (a NaN knee compares False)
+    if abs(pts[LK, 0] - pts[RK, 0]) < 0.08:
+        flags |= FormFlag.KNEES_CAVING.value
+        score -= 15
+    
+    return max(0, min(100, score)), flags
 
-def fast_form_analysis(landmarks: Dict, exercise: str) -> Dict:
-    """Lightning-fast form analysis for real-time feedback"""
-    score = 85  # Start with good score
+@njit(cache=True)
+def _check_pushup(pts: np.ndarray) -> Tuple[int, int]:
+    """Pushup score and findings: body alignment, on a side with shoulder and hip visible"""
+    side = _visible_side(pts, LS, LH, LS, LH)
+    if side < 0:
+        return 50, FormFlag.INCOMPLETE.value
+    if abs(pts[LS + side, 1] - pts[LH + side, 1]) > 0.15:
+        return 75, FormFlag.BODY_NOT_STRAIGHT.value
+    return 85, FormFlag.BODY_ALIGNED.value
+
+@njit(cache=True)
+def _check_plank(pts: np.ndarray) -> Tuple[int, int]:
+    """Plank score and findings: hips level with shoulders, on a side with both visible"""
+    side = _visible_side(pts, LS, LH, LS, LH)
+    if side < 0:
+        return 50, FormFlag.INCOMPLETE.value
+    if abs(pts[LH + side, 1] - pts[LS + side, 1]) > 0.1:
+        return 75, FormFlag.HIPS_MISALIGNED.value
+    return 85, FormFlag.GOOD_PLANK.value
+
+def _form_messages(flags: int) -> Tuple[List[str], List[str]]:
+    """Expand form flags into (feedback, warnings) lists"""
     feedback = []
     warnings = []
+    for flag, (flag_feedback, flag_warnings) in FORM_MESSAGES.items():
+        if flags & flag:
+            feedback.extend(flag_feedback)
+            warnings.extend(flag_warnings)
+    return feedback, warnings
+
+def fast_form_analysis(pts: np.ndarray, exercise: int) -> Dict:
+    """Lightning-fast form analysis for real-time feedback, given the exercise code"""
+    if exercise == SQUAT:
+        score, flags = _check_squat(pts)
+    elif exercise == PUSHUP:
+        score, flags = _check_pushup(pts)
+    elif exercise == PLANK:
+        score, flags = _check_plank(pts)
+    elif exercise == STANDING:
+        score, flags = 85, FormFlag.READY
+    else:
+        score, flags = 85, FormFlag.KEEP_MOVING
     
-    try:
-        if exercise == 'squat':
-            # Quick squat form check
-            left_knee_angle = calculate_angle_fast(
-                landmarks['left_hip'], landmarks['left_knee'], landmarks['left_ankle']
-            )
-            
-            if left_knee_angle < 70:
-                warnings.append("Too deep - ease up slightly")
-                score -= 10
-            elif left_knee_angle > 120:
-                feedback.append("Go deeper for better activation")
-                score -= 5
-            else:
-                feedback.append("Good squat depth!")
-            
-            # Knee alignment check
-            knee_distance = abs(landmarks['left_knee'][0] - landmarks['right_knee'][0])
-            if knee_distance < 0.08:
-                warnings.append("Knees caving in!")
-                score -= 15
-            
-        elif exercise == 'pushup':
-            # Quick pushup form check
-            body_alignment = abs(landmarks['left_shoulder'][1] - landmarks['left_hip'][1])
-            if body_alignment > 0.15:
-                warnings.append("Keep body straight!")
-                score -= 10
-            else:
-                feedback.append("Good body alignment")
-                
-        elif exercise == 'plank':
-            # Quick plank check
-            hip_shoulder_diff = abs(landmarks['left_hip'][1] - landmarks['left_shoulder'][1])
-            if hip_shoulder_diff > 0.1:
-                warnings.append("Align hips with shoulders")
-                score -= 10
-            else:
-                feedback.append("Perfect plank position!")
-        
-        elif exercise == 'standing':
-            feedback.append("Ready to exercise!")
-        
-        else:
-            feedback.append("Keep moving!")
-    
-    except KeyError:
-        warnings.append("Pose detection incomplete")
-        score = 50
-    
+    feedback, warnings = _form_messages(flags)
     return {
-        'score': max(0, min(100, score)),
+        'score': score,
         'feedback': feedback,
         'warnings': warnings,
-        'exercise': exercise
+        'exercise': EXERCISE_NAMES[exercise]
     }
 
-def analyze_frame_realtime(frame_data: bytes) -> Dict:
-    """Main real-time analysis function - optimized for speed"""
-    start_time = time.time()
+def decode_jpeg_rgb(frame_data: bytes) -> Optional[np.ndarray]:
+    """Decode a JPEG to RGB with libjpeg-turbo, at the smallest built-in scale that keeps
+    the long edge at least MAX_FRAME_EDGE; None if turbojpeg is unavailable or can't decode it"""
+    if turbo_jpeg is None:
+        return None
     
     try:
-        # Decode image data
-        image = Image.open(io.BytesIO(frame_data))
+        width, height = turbo_jpeg.decode_header(frame_data)[:2]
+        long_edge = max(width, height)
+        scaling_factor = next(
+            (factor for factor in JPEG_SCALING_FACTORS if long_edge * factor[0] // factor[1] >= MAX_FRAME_EDGE),
+            None
+        )
+        return turbo_jpeg.decode(frame_data, pixel_format=TJPF_RGB, scaling_factor=scaling_factor)
+    except OSError:  # e.g. CMYK JPEGs; OpenCV handles those
+        return None
+
+class RealtimeAnalyzer:
+    """A pose model and the per-frame state for analyzing one stream of frames.
+    
+    The pose model stays alive between frames: in video mode the person
+    detector only runs when tracking from the last frame's landmarks is lost,
+    so consecutive frames of a stream skip it. With tracking=False every frame
+    is detected from scratch, for callers whose frames don't form one stream.
+    An analyzer is not thread-safe; frames analyzed concurrently need one
+    analyzer each.
+    """
+    
+    def __init__(self, tracking: bool = True):
+        self.tracking = tracking
+        # Resolved per analyzer: a GPU fallback here leaves the module default alone
+        self.pose_backend = pose_backend
+        if self.pose_backend != 'mp_full':
+            try:
+                self.pose_landmarker = create_pose_landmarker(landmarker_model, use_gpu=self.pose_backend == 'trt_fp16',
+                                                              tracking=tracking)
+            except RuntimeError as e:
+                if self.pose_backend != 'trt_fp16':
+                    raise
+                # No usable GPU delegate here (e.g. no GPU support in this MediaPipe build)
+                print(f"GPU pose delegate unavailable, falling back to CPU: {e}", file=sys.stderr)
+                self.pose_backend = 'tflite_int8'
+                self.pose_landmarker = create_pose_landmarker(landmarker_model, use_gpu=False, tracking=tracking)
+            self.frame_timestamps_ms = itertools.count(0, TASKS_FRAME_INTERVAL_MS)
+            self.pose_model = None
+        else:
+            self.pose_landmarker = None
+            self.pose_model = mp_pose.Pose(
+                static_image_mode=not tracking,  # Track across frames
+                model_complexity=0,      # Fastest model (Lite)
+                smooth_landmarks=False,  # No smoothing, frames may not be consecutive
+                enable_segmentation=False,
+                min_detection_confidence=0.6,  # Lower for speed
+                min_tracking_confidence=0.5
+            )
+        
+        # Landmark coordinates and visibility of the current frame (float64, so the checks
+        # compute exactly as they would on the Python floats MediaPipe returns)
+        self._landmark_buf = np.empty((33, 2))
+        self._visibility_buf = np.empty(33)
+        
+        # Downscaled BGR and RGB frame buffers, reused while the frame size stays the same
+        self._small_buf = None
+        self._rgb_buf = None
         
-        # Convert to OpenCV format
-        frame = np.array(image)
-        if len(frame.shape) == 3:
-            if frame.shape[2] == 3:  # RGB
-                frame_rgb = frame
-            elif frame.shape[2] == 4:  # RGBA
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_RGBA2RGB)
+        # Thumbnail buffers for the frame gate, and the last analyzed frame's thumbnail and result
+        self._thumbnail_buf = np.empty((*KEYFRAME_SIZE[::-1], 3), dtype=np.uint8)
+        self._gray_buf = np.empty(KEYFRAME_SIZE[::-1], dtype=np.uint8)
+        self._last_gray = np.empty(KEYFRAME_SIZE[::-1], dtype=np.uint8)
+        self._last_result = None
+        self._frames_since_full = 0
+    
+    def detect_landmarks(self, frame_rgb: np.ndarray) -> Optional[Sequence]:
+        """Run pose detection on an RGB frame; returns the pose's landmarks, or None if no pose was found"""
+        if self.pose_landmarker is not None:
+            image = mp.Image(image_format=mp.ImageFormat.SRGB, data=frame_rgb)
+            if self.tracking:
+                result = self.pose_landmarker.detect_for_video(image, next(self.frame_timestamps_ms))
             else:
-                raise ValueError("Unsupported image format")
-        else:
-            raise ValueError("Invalid image dimensions")
+                result = self.pose_landmarker.detect(image)
+            return result.pose_landmarks[0] if result.pose_landmarks else None
+        
+        results = self.pose_model.process(frame_rgb)
+        return results.pose_landmarks.landmark if results.pose_landmarks else None
+    
+    def extract_key_landmarks(self, landmarks: Sequence) -> np.ndarray:
+        """Copy the landmark (x, y) coordinates into a (33, 2) array indexed by MediaPipe landmark index.
         
+        Landmarks below VISIBILITY_THRESHOLD are NaN. The array is the
+        analyzer's buffer, overwritten by the next call.
+        """
+        points = self._landmark_buf[:len(landmarks)]
+        points.reshape(-1)[:] = [v for lm in landmarks for v in (lm.x, lm.y)]
+        visibility = self._visibility_buf[:len(landmarks)]
+        visibility[:] = [lm.visibility for lm in landmarks]
+        points[visibility < VISIBILITY_THRESHOLD] = np.nan
+        return points
+    
+    def warmup(self):
+        """Run blank frames through pose detection and the analysis kernels, so the first
+        real frame doesn't pay for inference setup or JIT compilation"""
+        blank = np.zeros((256, 256, 3), dtype=np.uint8)
+        blank.flags.writeable = False
+        for _ in range(2):  # The first run sets up the interpreter, the second runs warm
+            self.detect_landmarks(blank)
+        
+        points = np.zeros((33, 2))
+        for exercise in (quick_exercise_detection(points), SQUAT, PUSHUP, PLANK):
+            fast_form_analysis(points, exercise)
+    
+    def _frame_buffers(self, height: int, width: int) -> Tuple[np.ndarray, np.ndarray]:
+        """The (downscaled BGR, RGB) work buffers for frames of the given size, re-created when the size changes"""
+        if self._rgb_buf is None or self._rgb_buf.shape[:2] != (height, width):
+            self._small_buf = np.empty((height, width, 3), dtype=np.uint8)
+            self._rgb_buf = np.empty((height, width, 3), dtype=np.uint8)
+        return self._small_buf, self._rgb_buf
+    
+    def analyze_pose(self, frame_rgb: np.ndarray, start_time: float) -> Dict:
+        """Detect the pose in an RGB frame and analyze its form"""
         # MediaPipe pose detection
-        results = pose_model.process(frame_rgb)
+        pose_landmarks = self.detect_landmarks(frame_rgb)
         
-        if not results.pose_landmarks:
+        if pose_landmarks is None:
             return {
                 'success': False,
                 'error': 'No pose detected',
@@ -193,7 +418,7 @@ def analyze_frame_realtime(frame_data: bytes) -> Dict:
             }
         
         # Extract landmarks
-        landmarks = extract_key_landmarks(results)
+        landmarks = self.extract_key_landmarks(pose_landmarks)
         
         # Quick exercise detection
         exercise = quick_exercise_detection(landmarks)
@@ -210,54 +435,329 @@ def analyze_frame_realtime(frame_data: bytes) -> Dict:
             'exercise': analysis['exercise'],
             'feedback': analysis['feedback'],
             'warnings': analysis['warnings'],
-            'landmarks_count': len(landmarks),
+            'landmarks_count': len(KEY_LANDMARKS),
             'performance': {
-                'target_latency_ms': 50,
+                'target_latency_ms': TARGET_LATENCY_MS,
                 'actual_latency_ms': processing_time,
-                'within_target': processing_time < 50
+                'within_target': processing_time < TARGET_LATENCY_MS
             }
         }
+    
+    def _reused_result(self, start_time: float) -> Dict:
+        """The last analyzed frame's result, reported for the current frame"""
+        processing_time = (time.time() - start_time) * 1000
+        result = {**self._last_result, 'processing_time_ms': processing_time, 'cached': True}
+        if 'performance' in result:
+            result['performance'] = {
+                **result['performance'],
+                'actual_latency_ms': processing_time,
+                'within_target': processing_time < TARGET_LATENCY_MS
+            }
+        return result
+    
+    def analyze_frame(self, frame_data: Union[bytes, np.ndarray], reuse_result: bool = True) -> Dict:
+        """Main real-time analysis function - optimized for speed.
         
+        frame_data is an encoded image, or an already decoded (height, width, 3)
+        BGR frame such as one from shared_memory_frame. reuse_result=False
+        always runs pose detection instead of reporting the last analyzed
+        frame's result for a near-identical frame, for callers whose frames
+        don't all come from one stream.
+        """
+        start_time = time.time()
+        
+        try:
+            frame_rgb = None
+            if isinstance(frame_data, np.ndarray):
+                frame = frame_data
+            else:
+                # JPEGs decode straight to RGB with libjpeg-turbo when available
+                if frame_data[:3] == JPEG_MAGIC:
+                    frame_rgb = decode_jpeg_rgb(frame_data)
+                
+                if frame_rgb is None:
+                    # Decode image data straight to a BGR array (alpha is dropped and
+                    # grayscale expanded to three channels)
+                    frame = cv2.imdecode(np.frombuffer(frame_data, dtype=np.uint8), cv2.IMREAD_COLOR)
+                    if frame is None:
+                        raise ValueError("Unsupported image format")
+            
+            # Downscale large frames (before the colour conversion, so that runs on fewer pixels)
+            height, width = (frame if frame_rgb is None else frame_rgb).shape[:2]
+            scale = MAX_FRAME_EDGE / max(height, width)
+            if scale < 1.0:
+                height, width = round(height * scale), round(width * scale)
+            small_buf, rgb_buf = self._frame_buffers(height, width)
+            
+            # MediaPipe takes RGB; the buffer is C-contiguous, and marking the frame
+            # read-only lets MediaPipe reference it instead of copying it
+            rgb_buf.flags.writeable = True
+            if frame_rgb is not None:
+                if scale < 1.0:
+                    frame_rgb = cv2.resize(frame_rgb, (width, height), dst=rgb_buf, interpolation=cv2.INTER_AREA)
+            else:
+                if scale < 1.0:
+                    frame = cv2.resize(frame, (width, height), dst=small_buf, interpolation=cv2.INTER_AREA)
+                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=rgb_buf)
+            frame_rgb.flags.writeable = False
+            
+            # Skip pose detection for frames that barely changed since the last analyzed
+            # one (up to KEYFRAME_MAX_REUSE in a row), or that lack the detail to find a pose in
+            thumbnail = cv2.resize(frame_rgb, KEYFRAME_SIZE, dst=self._thumbnail_buf, interpolation=cv2.INTER_AREA)
+            gray = cv2.cvtColor(thumbnail, cv2.COLOR_RGB2GRAY, dst=self._gray_buf)
+            if (reuse_result and self._last_result is not None and self._frames_since_full < KEYFRAME_MAX_REUSE
+                    and cv2.absdiff(gray, self._last_gray).mean() < KEYFRAME_DIFF_THRESHOLD):
+                self._frames_since_full += 1
+                return self._reused_result(start_time)
+            
+            if cv2.Laplacian(gray, cv2.CV_32F).var() < BLUR_VARIANCE_THRESHOLD:
+                return {
+                    'success': False,
+                    'error': 'Frame too blurry',
+                    'processing_time_ms': (time.time() - start_time) * 1000,
+                    'feedback': ['Hold the camera steady and make sure you are well lit'],
+                    'warnings': ['Frame too blurry'],
+                    'score': 0,
+                    'exercise': 'unknown'
+                }
+            
+            result = self.analyze_pose(frame_rgb, start_time)
+            np.copyto(self._last_gray, gray)
+            self._last_result = result
+            self._frames_since_full = 0
+            return result
+        
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f'Analysis failed: {str(e)}',
+                'processing_time_ms': (time.time() - start_time) * 1000,
+                'feedback': [],
+                'warnings': [f'Processing error: {str(e)}'],
+                'score': 0,
+                'exercise': 'error'
+            }
+
+# Tracking analyzer behind analyze_frame_realtime, for this process's single stream
+_default_analyzer: Optional[RealtimeAnalyzer] = None
+
+def default_analyzer() -> RealtimeAnalyzer:
+    """The analyzer behind analyze_frame_realtime, created on first use"""
+    global _default_analyzer
+    if _default_analyzer is None:
+        _default_analyzer = RealtimeAnalyzer()
+    return _default_analyzer
+
+def analyze_frame_realtime(frame_data: Union[bytes, np.ndarray], reuse_result: bool = True) -> Dict:
+    """Analyze one frame of the stream on the default analyzer (see RealtimeAnalyzer.analyze_frame)"""
+    return default_analyzer().analyze_frame(frame_data, reuse_result)
+
+def warmup():
+    """Warm up the default analyzer (see RealtimeAnalyzer.warmup)"""
+    default_analyzer().warmup()
+
+# Shared memory segments frames have been read from, kept attached between frames
+_shared_segments: Dict[str, shared_memory.SharedMemory] = {}
+
+def _attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    """Attach to an existing shared memory segment without taking ownership of it"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13 always registers it, and would unlink it at exit
+        segment = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(segment._name, 'shared_memory')
+        return segment
+
+def shared_memory_frame(name: str, height: int, width: int) -> np.ndarray:
+    """Zero-copy view of a raw (height, width, 3) uint8 BGR frame in the named shared memory segment.
+    
+    The writer owns the segment and must not overwrite the frame until its
+    result has been returned.
+    """
+    name = name.lstrip('/')  # POSIX names like "/fit_frame"; SharedMemory adds the slash itself
+    size = height * width * 3
+    segment = _shared_segments.get(name)
+    if segment is None or segment.size < size:  # New, or re-created larger by the writer
+        if segment is not None:
+            segment.close()
+        try:
+            segment = _attach_shared_memory(name)
+        except OSError as e:
+            raise ValueError(f"Failed to open shared memory {name!r}: {e}")
+        _shared_segments[name] = segment
+    
+    if segment.size < size:
+        raise ValueError(f"Shared memory {name!r} holds {segment.size} bytes, a {width}x{height} frame needs {size}")
+    return np.ndarray((height, width, 3), dtype=np.uint8, buffer=segment.buf)
+
+def write_json(payload: Dict) -> None:
+    """Write a JSON document as one line to stdout"""
+    sys.stdout.flush()  # Keep ordering with any earlier print() output
+    sys.stdout.buffer.write(orjson.dumps(payload) + b"\n")
+    sys.stdout.flush()
+
+def frame_from_request(request: Dict) -> Union[bytes, np.ndarray]:
+    """The frame of one request: base64 'frame_data', or raw BGR pixels in shared memory given by
+    'shm' (segment name), 'h' and 'w'. Raises ValueError for unusable input"""
+    if 'shm' in request:
+        try:
+            return shared_memory_frame(request['shm'], int(request['h']), int(request['w']))
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"Invalid shared memory frame request: {e!r}")
+    
+    # Extract frame data
+    frame_base64 = request.get('frame_data', '')
+    if not frame_base64:
+        raise ValueError("No frame data provided")
+    
+    # Decode base64 frame data
+    try:
+        return base64.b64decode(frame_base64)
     except Exception as e:
-        return {
-            'success': False,
-            'error': f'Analysis failed: {str(e)}',
-            'processing_time_ms': (time.time() - start_time) * 1000,
-            'feedback': [],
-            'warnings': [f'Processing error: {str(e)}'],
-            'score': 0,
-            'exercise': 'error'
-        }
+        raise ValueError(f"Failed to decode frame data: {str(e)}")
+
+def stream():
+    """Analyze one JSON frame request per stdin line until EOF, printing one JSON result per line.
+    
+    The pose model stays alive between frames, so MediaPipe tracks the person
+    from the previous frame's landmarks instead of re-running the detector.
+    {"op": "ping"} is answered with {"op": "pong"}.
+    """
+    warmup()
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        
+        try:
+            request = orjson.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("Request must be a JSON object")
+            if request.get('op') == 'ping':
+                result = {'op': 'pong'}
+            else:
+                result = analyze_frame_realtime(frame_from_request(request))
+        except ValueError as e:  # Includes malformed JSON
+            result = {"error": str(e)}
+        
+        write_json(result)
+
+# --server message framing: a 4-byte big-endian length, then that many bytes
+MESSAGE_HEADER = struct.Struct('>I')
+
+def _write_results(pending: queue.Queue, closed: threading.Event) -> None:
+    """Write the results of the futures serve() queues, length-prefixed and in queue order, until it queues None.
+    
+    Sets closed and stops if stdout can't be written to (the client went away).
+    """
+    stdout = sys.stdout.buffer
+    while True:
+        future = pending.get()
+        if future is None:
+            return
+        
+        payload = orjson.dumps(future.result())
+        try:
+            stdout.write(MESSAGE_HEADER.pack(len(payload)) + payload)
+            stdout.flush()
+        except OSError:  # e.g. BrokenPipeError
+            closed.set()
+            return
+
+def _put_unless_closed(pending: queue.Queue, item, closed: threading.Event) -> bool:
+    """Queue an item for the writer, giving up (False) once it has stopped"""
+    while not closed.is_set():
+        try:
+            pending.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+def serve():
+    """Analyze length-prefixed raw image frames from stdin until EOF, answering each with a length-prefixed JSON result.
+    
+    Frames are the encoded image bytes themselves (no JSON or base64); a
+    zero-length frame is answered with {"op": "pong"}. Up to SERVER_POOL_SIZE
+    frames are analyzed at once, frame n on analyzer n % SERVER_POOL_SIZE (so
+    each analyzer tracks its own frames in order), and results are written in
+    the order the frames arrived; clients may send the next frames without
+    waiting for earlier results. Stops when the client closes stdout.
+    """
+    analyzers = [default_analyzer()] + [RealtimeAnalyzer() for _ in range(SERVER_POOL_SIZE - 1)]
+    for analyzer in analyzers:
+        analyzer.warmup()
+    if SERVER_POOL_SIZE > 1:
+        # Split the cores between the analyzers, so OpenCV's resize and colour
+        # conversion threads don't oversubscribe them
+        cv2.setNumThreads(max(1, (os.cpu_count() or 1) // SERVER_POOL_SIZE))
+    
+    # One single-thread executor per analyzer, since an analyzer can't run two frames at once
+    executors = [ThreadPoolExecutor(max_workers=1) for _ in analyzers]
+    pending = queue.Queue(maxsize=2 * SERVER_POOL_SIZE)
+    closed = threading.Event()
+    writer = threading.Thread(target=_write_results, args=(pending, closed), daemon=True)
+    writer.start()
+    
+    stdin = sys.stdin.buffer
+    frame_count = 0
+    try:
+        while not closed.is_set():
+            header = stdin.read(MESSAGE_HEADER.size)
+            if len(header) < MESSAGE_HEADER.size:
+                break
+            (length,) = MESSAGE_HEADER.unpack(header)
+            frame_data = stdin.read(length)
+            if len(frame_data) < length:
+                break
+            
+            if length:
+                worker = frame_count % SERVER_POOL_SIZE
+                future = executors[worker].submit(analyzers[worker].analyze_frame, frame_data)
+                frame_count += 1
+            else:
+                future = Future()
+                future.set_result({'op': 'pong'})
+            if not _put_unless_closed(pending, future, closed):
+                break
+    finally:
+        _put_unless_closed(pending, None, closed)
+        writer.join()
+        for executor in executors:
+            executor.shutdown(cancel_futures=True)
+        if closed.is_set():
+            # Nobody reads stdout any more; keep the interpreter's final flush from failing on it
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
 
 def main():
-    """Command line interface for real-time analysis"""
+    """Command line interface for real-time analysis (one frame per run, or --stream / --server for many)"""
+    if '--stream' in sys.argv[1:]:
+        stream()
+        return
+    if '--server' in sys.argv[1:]:
+        serve()
+        return
+    
     try:
         # Read JSON input from stdin
         input_data = sys.stdin.read().strip()
         if not input_data:
-            print(json.dumps({"error": "No input data provided"}))
+            write_json({"error": "No input data provided"})
             sys.exit(1)
         
-        request = json.loads(input_data)
-        
-        # Extract frame data
-        frame_base64 = request.get('frame_data', '')
-        if not frame_base64:
-            print(json.dumps({"error": "No frame data provided"}))
-            sys.exit(1)
+        request = orjson.loads(input_data)
         
-        # Decode base64 frame data
         try:
-            frame_data = base64.b64decode(frame_base64)
-        except Exception as e:
-            print(json.dumps({"error": f"Failed to decode frame data: {str(e)}"}))
+            frame_data = frame_from_request(request)
+        except ValueError as e:
+            write_json({"error": str(e)})
             sys.exit(1)
         
         # Analyze frame
         result = analyze_frame_realtime(frame_data)
         
         # Output result
-        print(json.dumps(result))
+        write_json(result)
         
     except Exception as e:
         error_response = {
@@ -269,7 +769,7 @@ def main():
             "score": 0,
             "exercise": "error"
         }
-        print(json.dumps(error_response))
+        write_json(error_response)
         sys.exit(1)
 
 if __name__ == "__main__":
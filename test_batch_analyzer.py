@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the batch analyzer's rep counting and exercise segmentation
+on synthetic pose sequences
+"""
+
+import numpy as np
+
+from batch_analyzer import (
+    L_HIP, L_KNEE, L_SHOULDER, L_WRIST, N_JOINTS, R_HIP, R_KNEE, R_SHOULDER,
+    count_reps_in_sequence, segment_workout_into_exercises,
+)
+
+def poses_from_y(frames: list) -> np.ndarray:
+    """(frames, N_JOINTS, 3) poses from per-frame {joint: y} dicts; other joints sit at
+    y=0.5, frames given as None are missed poses (all NaN)"""
+    poses = np.full((len(frames), N_JOINTS, 3), 0.5)
+    for pose, joints in zip(poses, frames):
+        if joints is None:
+            pose[:] = np.nan
+            continue
+        for joint, y in joints.items():
+            pose[joint, 1] = y
+    return poses
+
+STANDING = {L_SHOULDER: 0.2, R_SHOULDER: 0.2, L_HIP: 0.5, R_HIP: 0.5, L_KNEE: 0.7, R_KNEE: 0.7}
+SQUATTING = {L_SHOULDER: 0.4, R_SHOULDER: 0.4, L_HIP: 0.68, R_HIP: 0.68, L_KNEE: 0.7, R_KNEE: 0.7}
+PUSHUP_TOP = {L_SHOULDER: 0.5, R_SHOULDER: 0.5, L_HIP: 0.55, R_HIP: 0.55, L_WRIST: 0.75}
+PUSHUP_BOTTOM = {L_SHOULDER: 0.7, R_SHOULDER: 0.7, L_HIP: 0.72, R_HIP: 0.72, L_WRIST: 0.75}
+
+def test_counts_squat_reps():
+    frames = [STANDING] * 3 + ([SQUATTING] * 3 + [STANDING] * 3) * 4
+    assert count_reps_in_sequence(poses_from_y(frames), 'squat') == 4
+
+def test_missed_poses_dont_break_a_rep():
+    frames = [STANDING, SQUATTING, None, None, STANDING, SQUATTING, STANDING]
+    assert count_reps_in_sequence(poses_from_y(frames), 'squat') == 2
+
+def test_unfinished_rep_is_not_counted():
+    frames = [STANDING, SQUATTING, STANDING, SQUATTING]
+    assert count_reps_in_sequence(poses_from_y(frames), 'squat') == 1
+
+def test_counts_pushup_reps():
+    frames = [PUSHUP_TOP] + [PUSHUP_BOTTOM, PUSHUP_BOTTOM, PUSHUP_TOP] * 3
+    assert count_reps_in_sequence(poses_from_y(frames), 'pushup') == 3
+
+def test_exercises_without_reps():
+    poses = poses_from_y([STANDING, SQUATTING, STANDING])
+    assert count_reps_in_sequence(poses, 'plank') == 0
+    assert count_reps_in_sequence(poses[:0], 'squat') == 0
+
+def test_segments_runs_of_one_exercise():
+    # Squats, a brief loss of the pose (too short to be a segment), then push-ups
+    frames = [SQUATTING] * 10 + [None] * 3 + [PUSHUP_BOTTOM] * 8
+    timestamps = np.arange(len(frames)) * 0.5
+
+    segments = segment_workout_into_exercises(poses_from_y(frames), timestamps)
+
+    assert [(s['exercise'], s['start'], s['end'], s['frame_count']) for s in segments] == [
+        ('squat', 0, 10, 10),
+        ('pushup', 13, 21, 8),
+    ]
+    assert (segments[1]['start_time'], segments[1]['end_time'], segments[1]['duration']) == (6.5, 10.0, 3.5)
+
+def test_short_runs_are_dropped():
+    frames = [SQUATTING] * 5 + [PUSHUP_BOTTOM] * 5
+    assert segment_workout_into_exercises(poses_from_y(frames), np.arange(len(frames), dtype=float)) == []
@@ -15,44 +15,42 @@ from pathlib import Path
 RUST_API_BASE = "http://localhost:3000"
 PYTHON_ML_BASE = "http://localhost:8001"
 
-async def test_ml_service_health():
+async def test_ml_service_health(session: aiohttp.ClientSession):
     """Test Python ML service health endpoint"""
     print("Testing ML service health...")
     
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.get(f"{PYTHON_ML_BASE}/health") as response:
-                if response.status == 200:
-                    data = await response.json()
-                    print(f"✅ ML service health: {data['status']}")
-                    print(f"   Models loaded: {data['models_loaded']}")
-                    return True
-                else:
-                    print(f"❌ ML service health check failed: {response.status}")
-                    return False
-        except Exception as e:
-            print(f"❌ ML service not reachable: {e}")
-            return False
+    try:
+        async with session.get(f"{PYTHON_ML_BASE}/health") as response:
+            if response.status == 200:
+                data = await response.json()
+                print(f"✅ ML service health: {data['status']}")
+                print(f"   Models loaded: {data['models_loaded']}")
+                return True
+            else:
+                print(f"❌ ML service health check failed: {response.status}")
+                return False
+    except Exception as e:
+        print(f"❌ ML service not reachable: {e}")
+        return False
 
-async def test_rust_api_health():
+async def test_rust_api_health(session: aiohttp.ClientSession):
     """Test Rust API health endpoint"""
     print("Testing Rust API health...")
     
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.get(f"{RUST_API_BASE}/api/health") as response:
-                if response.status == 200:
-                    data = await response.json()
-                    print(f"✅ Rust API health: {data['status']}")
-                    return True
-                else:
-                    print(f"❌ Rust API health check failed: {response.status}")
-                    return False
-        except Exception as e:
-            print(f"❌ Rust API not reachable: {e}")
-            return False
+    try:
+        async with session.get(f"{RUST_API_BASE}/api/health") as response:
+            if response.status == 200:
+                data = await response.json()
+                print(f"✅ Rust API health: {data['status']}")
+                return True
+            else:
+                print(f"❌ Rust API health check failed: {response.status}")
+                return False
+    except Exception as e:
+        print(f"❌ Rust API not reachable: {e}")
+        return False
 
-async def test_ml_integration():
+async def test_ml_integration(session: aiohttp.ClientSession):
     """Test ML integration through Rust API"""
     print("Testing ML integration through Rust API...")
     
@@ -63,56 +61,54 @@ async def test_ml_integration():
         "frame_base64": test_image_data
     }
     
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.post(f"{RUST_API_BASE}/api/ml/analyze-frame", json=payload) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    if data['success']:
-                        result = data['data']
-                        print(f"✅ ML frame analysis successful")
-                        print(f"   Processing time: {result.get('processing_time_ms', 'N/A')}ms")
-                        print(f"   Result keys: {list(result.keys())}")
-                        return True
-                    else:
-                        print(f"❌ ML analysis failed: {data.get('message', 'Unknown error')}")
-                        return False
+    try:
+        async with session.post(f"{RUST_API_BASE}/api/ml/analyze-frame", json=payload) as response:
+            if response.status == 200:
+                data = await response.json()
+                if data['success']:
+                    result = data['data']
+                    print(f"✅ ML frame analysis successful")
+                    print(f"   Processing time: {result.get('processing_time_ms', 'N/A')}ms")
+                    print(f"   Result keys: {list(result.keys())}")
+                    return True
                 else:
-                    error_text = await response.text()
-                    print(f"❌ ML integration test failed: {response.status}")
-                    print(f"   Error: {error_text}")
+                    print(f"❌ ML analysis failed: {data.get('message', 'Unknown error')}")
                     return False
-        except Exception as e:
-            print(f"❌ ML integration test error: {e}")
-            return False
+            else:
+                error_text = await response.text()
+                print(f"❌ ML integration test failed: {response.status}")
+                print(f"   Error: {error_text}")
+                return False
+    except Exception as e:
+        print(f"❌ ML integration test error: {e}")
+        return False
 
-async def test_ml_service_status():
+async def test_ml_service_status(session: aiohttp.ClientSession):
     """Test ML service status through Rust API"""
     print("Testing ML service status through Rust API...")
     
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.get(f"{RUST_API_BASE}/api/ml/status") as response:
-                if response.status == 200:
-                    data = await response.json()
-                    if data['success']:
-                        status = data['data']
-                        print(f"✅ ML service status retrieved")
-                        print(f"   Motion analyzer: {status.get('motion_analyzer', False)}")
-                        print(f"   Realtime analyzer: {status.get('realtime_analyzer', False)}")
-                        print(f"   PyTorch available: {status.get('pytorch_available', False)}")
-                        return True
-                    else:
-                        print(f"❌ ML status check failed: {data.get('message', 'Unknown error')}")
-                        return False
+    try:
+        async with session.get(f"{RUST_API_BASE}/api/ml/status") as response:
+            if response.status == 200:
+                data = await response.json()
+                if data['success']:
+                    status = data['data']
+                    print(f"✅ ML service status retrieved")
+                    print(f"   Motion analyzer: {status.get('motion_analyzer', False)}")
+                    print(f"   Realtime analyzer: {status.get('realtime_analyzer', False)}")
+                    print(f"   PyTorch available: {status.get('pytorch_available', False)}")
+                    return True
                 else:
-                    print(f"❌ ML status request failed: {response.status}")
+                    print(f"❌ ML status check failed: {data.get('message', 'Unknown error')}")
                     return False
-        except Exception as e:
-            print(f"❌ ML status test error: {e}")
-            return False
+            else:
+                print(f"❌ ML status request failed: {response.status}")
+                return False
+    except Exception as e:
+        print(f"❌ ML status test error: {e}")
+        return False
 
-async def test_user_creation():
+async def test_user_creation(session: aiohttp.ClientSession):
     """Test user creation through Rust API"""
     print("Testing user creation...")
     
@@ -135,25 +131,42 @@ async def test_user_creation():
         }
     }
     
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.post(f"{RUST_API_BASE}/api/users", json=user_data) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    if data['success']:
-                        print(f"✅ User created successfully")
-                        return True
-                    else:
-                        print(f"❌ User creation failed: {data.get('message', 'Unknown error')}")
-                        return False
+    try:
+        async with session.post(f"{RUST_API_BASE}/api/users", json=user_data) as response:
+            if response.status == 200:
+                data = await response.json()
+                if data['success']:
+                    print(f"✅ User created successfully")
+                    return True
                 else:
-                    error_text = await response.text()
-                    print(f"❌ User creation request failed: {response.status}")
-                    print(f"   Error: {error_text}")
+                    print(f"❌ User creation failed: {data.get('message', 'Unknown error')}")
                     return False
-        except Exception as e:
-            print(f"❌ User creation test error: {e}")
-            return False
+            else:
+                error_text = await response.text()
+                print(f"❌ User creation request failed: {response.status}")
+                print(f"   Error: {error_text}")
+                return False
+    except Exception as e:
+        print(f"❌ User creation test error: {e}")
+        return False
+
+async def run_test(session: aiohttp.ClientSession, test_name: str, test_func) -> tuple:
+    """Run one test, returning (name, passed, duration)"""
+    print(f"\n📋 Running: {test_name}")
+    start_time = time.time()
+    
+    try:
+        result = await test_func(session)
+        duration = time.time() - start_time
+        
+        status = "✅ PASSED" if result else "❌ FAILED"
+        print(f"   {status}: {test_name} ({duration:.2f}s)")
+        return test_name, result, duration
+        
+    except Exception as e:
+        duration = time.time() - start_time
+        print(f"   ❌ FAILED: {test_name} ({duration:.2f}s): {e}")
+        return test_name, False, duration
 
 async def run_integration_tests():
     """Run all integration tests"""
@@ -168,25 +181,13 @@ async def run_integration_tests():
         ("ML Integration", test_ml_integration),
     ]
     
-    results = []
-    
-    for test_name, test_func in tests:
-        print(f"\n📋 Running: {test_name}")
-        print("-" * 40)
-        start_time = time.time()
-        
-        try:
-            result = await test_func()
-            duration = time.time() - start_time
-            results.append((test_name, result, duration))
-            
-            status = "✅ PASSED" if result else "❌ FAILED"
-            print(f"   {status} ({duration:.2f}s)")
-            
-        except Exception as e:
-            duration = time.time() - start_time
-            results.append((test_name, False, duration))
-            print(f"   ❌ FAILED ({duration:.2f}s): {e}")
+    # The tests are independent probes, so they run concurrently over one
+    # keep-alive session (their output may interleave; the summary is in order)
+    connector = aiohttp.TCPConnector(limit=16, keepalive_timeout=30)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        results = await asyncio.gather(*(
+            run_test(session, test_name, test_func) for test_name, test_func in tests
+        ))
     
     # Summary
     print("\n" + "=" * 60)
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Unit tests for MotionAnalyzer's frame caches: results reused for near-identical
+frames and held poses, and their invalidation through reset_frame_caches
+"""
+
+import numpy as np
+import pytest
+
+from ml_analyzer import MotionAnalyzer
+
+@pytest.fixture(scope='module')
+def analyzer():
+    return MotionAnalyzer(model_complexity=0)
+
+@pytest.fixture(autouse=True)
+def fresh_caches(analyzer):
+    analyzer.reset_frame_caches()
+
+def test_near_identical_frame_reuses_result(analyzer):
+    frame = np.full((256, 256, 3), 128, dtype=np.uint8)
+    assert analyzer.analyze_rgb_frame(frame) is analyzer.analyze_rgb_frame(frame.copy())
+
+def test_reset_frame_caches_forgets_last_frame(analyzer):
+    frame = np.full((256, 256, 3), 128, dtype=np.uint8)
+    first = analyzer.analyze_rgb_frame(frame)
+    analyzer.reset_frame_caches()
+    second = analyzer.analyze_rgb_frame(frame)
+
+    assert second is not first
+    assert second == first
+
+def test_reset_frame_caches_forgets_held_pose(analyzer):
+    points = np.tile([0.5, 0.5], (13, 1))
+    first = analyzer._analyze_exercise_form(points, 'plank')
+    assert analyzer._analyze_exercise_form(points.copy(), 'plank') is first
+
+    analyzer.reset_frame_caches()
+    assert analyzer._analyze_exercise_form(points, 'plank') is not first
+
+def test_image_analysis_ignores_cached_video_frame(analyzer):
+    frame = np.full((256, 256, 3), 128, dtype=np.uint8)
+    cached = analyzer.analyze_rgb_frame(frame)
+    assert analyzer.analyze_image(frame) is not cached
+    assert analyzer._last_result is None
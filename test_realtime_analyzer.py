@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the real-time analyzer: side-view exercise detection and the
+--server message framing
+"""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import orjson
+
+from realtime_analyzer import (
+    LH, LK, LS, LW, MESSAGE_HEADER, PUSHUP, RH, RK, RS, RW, SQUAT, UNKNOWN,
+    _visible_side, quick_exercise_detection,
+)
+
+def side_pose(shoulder_y: float, hip_y: float, knee_y: float, wrist_y: float, side: int) -> np.ndarray:
+    """(33, 2) landmarks with only one body side visible (0 left, 1 right); the rest are NaN"""
+    pts = np.full((33, 2), np.nan)
+    for landmark, y in ((LS, shoulder_y), (LH, hip_y), (LK, knee_y), (LW, wrist_y)):
+        pts[landmark + side] = (0.5, y)
+    return pts
+
+def test_visible_side_prefers_left():
+    pts = side_pose(0.3, 0.5, 0.7, 0.4, side=0)
+    pts[[RS, RH, RK, RW]] = pts[[LS, LH, LK, LW]]
+    assert _visible_side(pts, LS, LH, LK, LW) == 0
+
+def test_visible_side_falls_back_to_right():
+    pts = side_pose(0.3, 0.5, 0.7, 0.4, side=1)
+    assert _visible_side(pts, LS, LH, LK, LW) == 1
+
+def test_visible_side_none_visible():
+    pts = side_pose(0.3, 0.5, 0.7, 0.4, side=0)
+    pts[LK] = np.nan
+    assert _visible_side(pts, LS, LH, LK, LW) == -1
+
+def test_side_view_pushup_with_far_side_hidden():
+    # Horizontal body with the wrists under the shoulders, seen from the left
+    assert quick_exercise_detection(side_pose(0.50, 0.52, 0.53, 0.55, side=0)) == PUSHUP
+
+def test_side_view_squat_with_far_side_hidden():
+    # Hips dropped to knee level, seen from the right
+    assert quick_exercise_detection(side_pose(0.30, 0.55, 0.55, 0.40, side=1)) == SQUAT
+
+def test_no_visible_side_is_unknown():
+    assert quick_exercise_detection(np.full((33, 2), np.nan)) == UNKNOWN
+
+
+def read_message(stdout) -> dict:
+    """Read one length-prefixed JSON message from the server"""
+    (length,) = MESSAGE_HEADER.unpack(stdout.read(MESSAGE_HEADER.size))
+    return orjson.loads(stdout.read(length))
+
+def test_server_framing_round_trip():
+    script = Path(__file__).with_name('realtime_analyzer.py')
+    env = {**os.environ, 'FA_REALTIME_POOL_SIZE': '1'}
+    frames = [b'', b'not an image', b'']
+    request = b''.join(MESSAGE_HEADER.pack(len(frame)) + frame for frame in frames)
+
+    with subprocess.Popen([sys.executable, str(script), '--server'], env=env,
+                          stdin=subprocess.PIPE, stdout=subprocess.PIPE) as server:
+        # All frames go out before any result is read; results come back in order
+        server.stdin.write(request)
+        server.stdin.close()
+
+        pong, failed, second_pong = (read_message(server.stdout) for _ in frames)
+        assert server.stdout.read() == b''  # Nothing after the last result
+        assert server.wait(timeout=60) == 0
+
+    assert pong == second_pong == {'op': 'pong'}
+    assert failed['success'] is False
+    assert 'Unsupported image format' in failed['error']